@@ -0,0 +1,159 @@
+"""
+Persistent on-disk cache of raw JSON responses from the corpus APIs.
+
+Each response is stored in its own file named by a hash of (backend, corpus, normalised CQL query, page size).
+The file is in the JSON Lines format: a header with the creation time and then one concordance line per row.
+Entries older than settings.RESPONSE_CACHE_TTL seconds are ignored, and when the cache grows over
+settings.RESPONSE_CACHE_MAX_BYTES, the least recently used entries are deleted. Empty responses and responses
+whose computation the polling did not wait for (see api/polling.py) are not stored, so a transient failure
+is not repeated from the cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from opravidlo_annotations import settings
+
+logging.basicConfig(level=logging.INFO)
+
+
+def normalise_query(query: str) -> str:
+    """
+    Normalise a CQL query so that queries differing only in formatting share the cache entry.
+    Whitespace outside the quoted strings is removed, the quoted strings are kept unchanged.
+
+    Examples:
+        '[lemma="vybít"  &  lc="nevybi.*"]' -> '[lemma="vybít"&lc="nevybi.*"]'
+    """
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', query.strip())
+    return "".join(part if part.startswith('"') else re.sub(r"\s+", "", part) for part in parts)
+
+
+def make_cache_key(backend: str, corpus_name: str, query: str, page_size: int) -> str:
+    """
+    Returns: Hash identifying the response for the given backend, corpus, query and page size.
+    """
+    raw_key = json.dumps([backend, corpus_name, normalise_query(query), page_size], ensure_ascii=False)
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> Path:
+    return settings.RESPONSE_CACHE_DIR / f"{key}.jsonl"
+
+
+def _iter_cached_lines(path: Path) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        f.readline()    # the header
+        for line in f:
+            yield json.loads(line)
+
+
+def get_cached_lines(key: str) -> Iterator[dict] | None:
+    """
+    Returns: Iterator over the cached concordance lines, or None if they are not cached or are older than the TTL.
+    """
+    path = _cache_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if time.time() - header["created"] > settings.RESPONSE_CACHE_TTL:
+        path.unlink(missing_ok=True)
+        return None
+
+    os.utime(path)  # the modification time serves as the last access time for the LRU eviction
+    return _iter_cached_lines(path)
+
+
+def _store_lines(key: str, lines: Iterator[dict], meta: dict) -> Iterator[dict]:
+    """
+    Yield the lines and write them into the cache at the same time. The entry is stored only if all lines
+    are consumed; if the consumer stops early or the download fails, nothing is stored. Nothing is stored either
+    if there are no lines or if meta (the other fields of the response, filled while the lines are read)
+    is marked with "timed_out".
+    """
+    settings.RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        number_of_lines = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"created": time.time()}) + "\n")
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+                number_of_lines += 1
+                yield line
+        if not number_of_lines or meta.get("timed_out"):
+            logging.info("The response is empty or incomplete, it is not cached.")
+            return
+        os.replace(tmp_path, path)     # atomic, so a concurrent reader never sees a half-written file
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    evict_least_recently_used(settings.RESPONSE_CACHE_MAX_BYTES)
+
+
+def evict_least_recently_used(max_bytes: int) -> None:
+    """
+    Delete the least recently used entries until the total size of the cache is at most max_bytes.
+    """
+    entries = []
+    for path in settings.RESPONSE_CACHE_DIR.glob("*.jsonl"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:   # deleted by another process meanwhile
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total_size -= size
+
+
+def clear_cache() -> None:
+    """
+    Delete all cached responses.
+    """
+    for path in settings.RESPONSE_CACHE_DIR.glob("*.jsonl"):
+        path.unlink(missing_ok=True)
+
+
+def cached_lines(backend: str, corpus_name: str, query: str, page_size: int,
+                 fetch_lines: Callable[[], Iterator[dict]], use_cache: bool = True) -> Iterator[dict]:
+    """
+    Yield the cached concordance lines for the request, or the lines from fetch_lines() which are cached meanwhile.
+    The lines are read and written one by one, so the memory does not grow with their number.
+
+    Args:
+        backend: "kontext" or "sketch"
+        corpus_name: The name of the corpus
+        query: CQL query
+        page_size: The number of requested concordances
+        fetch_lines: Function which returns an iterator over the downloaded lines; it gets a dict into which
+                     the other fields of the response are stored, see _store_lines
+        use_cache: False bypasses the cache; the lines are downloaded and the cached entry is overwritten
+
+    Yields:
+        Concordance lines in JSON.
+    """
+    key = make_cache_key(backend, corpus_name, query, page_size)
+    if use_cache:
+        lines = get_cached_lines(key)
+        if lines is not None:
+            logging.info(f"Using cached response: {backend}, '{corpus_name}', '{query}', {page_size}.")
+            yield from lines
+            return
+
+    meta = {}
+    yield from _store_lines(key, fetch_lines(meta), meta)
@@ -0,0 +1,121 @@
+"""
+Incremental parsing of large JSON responses.
+
+The concordance responses are objects with one big "Lines" array and a few small fields. iter_json_array yields
+the items of such array one by one while the response is being downloaded, so the memory needed is given
+by one item, not by the whole response.
+"""
+import codecs
+import json
+import re
+from collections.abc import Iterable, Iterator
+
+_whitespace = re.compile(r"\s*")
+_number_chars = re.compile(r"[0-9.eE+-]*")   # what may follow a decoded number if it continues in the next chunk
+_decoder = json.JSONDecoder()
+_compact_after = 1 << 16    # drop the consumed part of the buffer once it is longer than this
+
+
+class _Reader:
+    """
+    Buffer over the text chunks which is filled on demand.
+    """
+
+    def __init__(self, chunks: Iterable[bytes | str]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """
+        Append the next chunk to the buffer. Returns: False if there are no more chunks.
+        """
+        if self.exhausted:
+            return False
+        if self.position > _compact_after:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.exhausted = True
+            self.buffer += self._decoder.decode(b"", final=True)
+            return False
+        self.buffer += self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it ("" at the end of the input).
+        """
+        while True:
+            self.position = _whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected '{char}', found '{found}' at position {self.position}.")
+        self.position += 1
+
+    def value(self):
+        """
+        Decode and consume the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # a number near the end of the buffer may continue in the next chunk: "12" + "5" or "12." + "5";
+            # raw_decode stops before a trailing "." or "e", so the number is complete only when another character
+            # follows it
+            if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and _number_chars.match(self.buffer, end).end() == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
+
+
+def iter_json_array(chunks: Iterable[bytes | str], key: str, meta: dict = None) -> Iterator:
+    """
+    Yield the items of the array stored under the key of a JSON object, parsing the input incrementally.
+
+    Args:
+        chunks: Parts of the JSON text, e.g. response.iter_content(chunk_size).
+        key: The key of the array in the top-level object, e.g. "Lines".
+        meta: If given, the other top-level fields are stored into it as they are parsed. Fields placed after
+              the array are available only after the iteration has finished.
+
+    Yields:
+        The decoded items of the array. Nothing is yielded if the key is missing.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        field = reader.value()
+        reader.expect(":")
+        if field == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value()
+                    if reader.peek() == "]":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+        else:
+            value = reader.value()
+            if meta is not None:
+                meta[field] = value
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
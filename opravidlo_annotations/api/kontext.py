@@ -1,44 +1,143 @@
 """
 Kontext API documentation: https://github.com/czcorpus/kontext/wiki/API-Creating-a-concordance
-limits: 12 requests/second; 5000 requests/day
+limits: 12 requests/second; 5000 requests/day (enforced client-side by `rate_limiter`, see settings.py)
 """
 
 import pickle
 import logging
+import threading
+from collections.abc import Iterator
 
 import requests
 
 from opravidlo_annotations import settings
+from opravidlo_annotations.api.json_stream import iter_json_array
+from opravidlo_annotations.api.polling import poll_until_ready
+from opravidlo_annotations.api.rate_limit import RateLimiter
+from opravidlo_annotations.api.resilience import call_with_retries
+from opravidlo_annotations.api.transport import new_session
 from opravidlo_annotations.settings import OPRAVIDLO_DIR
 
 logging.basicConfig(level=logging.INFO)
 cookies_file_path = OPRAVIDLO_DIR / "opravidlo_annotations" / "api" / "cookies.pickle"
 kontext_api_point = "https://korpus.cz/kontext-api/v0.17/"
 
+rate_limiter = RateLimiter(settings.KONTEXT_REQUESTS_PER_SECOND, settings.KONTEXT_REQUESTS_PER_DAY,
+                           settings.KONTEXT_QUOTA_LEDGER, wait_on_quota=settings.KONTEXT_WAIT_ON_QUOTA)
 
-def setup_session() -> requests.Session:
-    """
-    Create a session with loaded or refreshed cookies and log in to kontext with personal token.
 
-    Returns:
-        requests.Session: Authenticated session with valid cookies.
+_session = None
+_session_lock = threading.Lock()
+_login_generation = 0   # incremented with every login, so concurrent threads do not log in repeatedly
+
+
+def _login(session: requests.Session) -> None:
     """
-    session = requests.Session()
-    try:
-        with open(cookies_file_path, "rb") as f:
-            session.cookies.update(pickle.load(f))
-    except FileNotFoundError:
-        logging.info(f"No existing cookies found at '{cookies_file_path}, logging in with access token.")
-        logging.info("And creating new cookies file.")
+    Log in to Kontext with the personal token and store the new cookies on disk.
 
-    response = session.post("https://korpus.cz/login", data={"personal_access_token": settings.KONTEXT_TOKEN})
+    Args:
+        session (requests.Session): Session to be authenticated.
+    """
+    global _login_generation
+    response = call_with_retries("kontext", _send, session, "POST", "https://korpus.cz/login",
+                                 data={"personal_access_token": settings.KONTEXT_TOKEN})
     if response.status_code != 200:
         raise RuntimeError("Login failed or token is invalid.")
+    _login_generation += 1
 
     with open(cookies_file_path, "wb") as f:
         pickle.dump(session.cookies, f)
 
-    return session
+
+def _has_valid_cookies(session: requests.Session) -> bool:
+    """
+    Check without any request whether the session holds some korpus.cz cookies which have not expired yet.
+    """
+    return any("korpus.cz" in cookie.domain and not cookie.is_expired() for cookie in session.cookies)
+
+
+def _send(session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send a single request to Kontext as soon as the rate limiter allows it.
+    """
+    rate_limiter.acquire()
+    return session.request(method, url, **kwargs)
+
+
+def _request(session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send a request to Kontext. Every call to Kontext has to go through this function, so the API limits are kept.
+    Transient failures are retried (see api/resilience.py).
+    If the request is rejected as unauthenticated, log in again and repeat the request once.
+
+    Args:
+        session (requests.Session): Session used for the request.
+        method (str): HTTP method, e.g. "GET" or "POST".
+        url (str): Requested URL.
+        **kwargs: Passed to session.request.
+
+    Returns:
+        requests.Response: The response.
+
+    Raises:
+        QuotaExceededError: If the daily quota is used up and settings.KONTEXT_WAIT_ON_QUOTA is False.
+    """
+    generation = _login_generation
+    response = call_with_retries("kontext", _send, session, method, url, **kwargs)
+    if response.status_code not in (401, 403):
+        return response
+
+    logging.info("Kontext session expired, logging in again.")
+    with _session_lock:
+        if generation == _login_generation:     # nobody else has logged in meanwhile
+            _login(session)
+    return call_with_retries("kontext", _send, session, method, url, **kwargs)
+
+
+def get_remaining_quota() -> int:
+    """
+    Returns:
+        int: How many requests to Kontext can still be made today (shared across all processes).
+    """
+    return rate_limiter.remaining()
+
+
+def setup_session() -> requests.Session:
+    """
+    Return the session shared by all Kontext calls in the process. It is created on the first call:
+    the stored cookies are reused if they are still valid, otherwise the session logs in with the personal token.
+    If the cookies turn out to be rejected by the server later, the session logs in again automatically (see _request).
+
+    Returns:
+        requests.Session: Authenticated session with valid cookies.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            return _session
+
+        session = new_session()
+        try:
+            with open(cookies_file_path, "rb") as f:
+                session.cookies.update(pickle.load(f))
+        except FileNotFoundError:
+            logging.info(f"No existing cookies found at '{cookies_file_path}, logging in with access token.")
+            logging.info("And creating new cookies file.")
+
+        if not _has_valid_cookies(session):
+            _login(session)
+
+        _session = session
+        return _session
+
+
+def reset_session() -> None:
+    """
+    Drop the shared session, the next setup_session call creates a new one.
+    """
+    global _session
+    with _session_lock:
+        _session = None
 
 
 def submit_query(session: requests.Session, corpus_name: str, query: str, number_of_concordances: int,
@@ -60,8 +159,6 @@ def submit_query(session: requests.Session, corpus_name: str, query: str, number
     else:
         shuffle_int = 0
 
-    query = "[word=\".*\"]"*20+query+"[word=\".*\"]"*20     # workaround: increases the left and the right context
-
     request_body = {
         "type": "concQueryArgs",
         "maincorp": corpus_name,
@@ -72,7 +169,7 @@ def submit_query(session: requests.Session, corpus_name: str, query: str, number
         "ctxattrs": [],                 # a list of non-KWIC positional attributes to be retrieved
         "attr_vmode": "visible-kwic",
         "base_viewattr": "word",
-        "structs": ["text", "p", "g"],
+        "structs": [],                  # no structures are needed, only the words
         "refs": [],
         "fromp": 0,
         "shuffle": shuffle_int,
@@ -98,14 +195,30 @@ def submit_query(session: requests.Session, corpus_name: str, query: str, number
         "async": True
     }
 
-    response = session.post(f"{kontext_api_point}/query_submit?format=json", params={"format": "json"}, json=request_body)
+    response = _request(session, "POST", f"{kontext_api_point}/query_submit?format=json", params={"format": "json"}, json=request_body)
     response.raise_for_status()
     data = response.json()
 
     return data["conc_persistence_op_id"]
 
 
-def fetch_concordances_by_id(session: requests.Session, op_id: str, number_of_concordances: int) -> dict:
+def _view_params(op_id: str, number_of_concordances: int, page_number: int) -> dict:
+    return {
+        "format": "json",
+        "q": f"~{op_id}",
+        "pagesize": number_of_concordances,
+        "fromp": page_number,
+        "kwicleftctx": -20,     # the left and the right context in tokens
+        "kwicrightctx": 20,
+        "attrs": "word",        # only the attributes and structures which are really used are returned
+        "ctxattrs": "word",
+        "structs": "",
+        "refs": "",
+    }
+
+
+def fetch_concordances_by_id(session: requests.Session, op_id: str, number_of_concordances: int,
+                             page_number: int = 1) -> dict:
     """
     Fetch and return the concordances in JSON format.
 
@@ -113,14 +226,83 @@ def fetch_concordances_by_id(session: requests.Session, op_id: str, number_of_co
         session (requests.Session): Authenticated session.
         op_id (str): Concordance persistence operation ID.
         number_of_concordances (int): the number of displayed concordances
+        page_number (int, optional): which page of the size number_of_concordances to fetch, starting from 1.
 
     Returns:
         dict: Concordances in JSON.
     """
-    response = session.get(f"{kontext_api_point}/view", params={
-        "format": "json",
-        "q": f"~{op_id}",
-        "pagesize": number_of_concordances,
-    })
+    response = _request(session, "GET", f"{kontext_api_point}/view",
+                        params=_view_params(op_id, number_of_concordances, page_number))
     response.raise_for_status()
     return response.json()
+
+
+def _iter_page_lines(session: requests.Session, op_id: str, page_size: int, page_number: int,
+                     meta: dict = None) -> Iterator[dict]:
+    """
+    Yield the lines of one page of the concordance while the response is being downloaded and parsed.
+    The other fields of the response (e.g. "finished" and "concsize") are stored into meta if it is given.
+    """
+    response = _request(session, "GET", f"{kontext_api_point}/view",
+                        params=_view_params(op_id, page_size, page_number), stream=True)
+    with response:
+        response.raise_for_status()
+        yield from iter_json_array(response.iter_content(chunk_size=settings.STREAM_CHUNK_SIZE), "Lines", meta)
+
+
+def _fetch_first_page(session: requests.Session, op_id: str, page_size: int) -> dict:
+    """
+    Returns: The first page of the concordance with its "Lines" and the other fields of the response.
+    """
+    meta = {}
+    lines = list(_iter_page_lines(session, op_id, page_size, 1, meta))
+    return {**meta, "Lines": lines}
+
+
+def iter_concordances_by_id(session: requests.Session, op_id: str, page_size: int = None,
+                            max_lines: int = None, meta: dict = None) -> Iterator[dict]:
+    """
+    Yield the concordance lines one by one, downloading them page by page.
+    The next page is requested only when the lines of the previous one are consumed, so the processing
+    can start with the first page and the download stops as soon as the caller stops iterating.
+    The pages after the first one are parsed incrementally, so only one line at a time is held in memory.
+    The first page is read whole, because its "finished" and "concsize" fields tell whether the concordance
+    is still being computed; only then it is requested again until it is finished or has at least max_lines lines
+    (see api/polling.py), so a finished concordance costs no extra request.
+
+    Args:
+        session (requests.Session): Authenticated session.
+        op_id (str): Concordance persistence operation ID.
+        page_size (int, optional): the number of concordances downloaded in one request.
+                                   Defaults to settings.KONTEXT_PAGE_SIZE.
+        max_lines (int, optional): stop after this number of lines. Defaults to all lines of the concordance.
+        meta (dict, optional): the other fields of the first page (e.g. "concsize", or "timed_out" if the polling
+                               gave up, see poll_until_ready) are stored into it.
+
+    Yields:
+        dict: One concordance line from the "Lines" list of the Kontext response.
+    """
+    if page_size is None:
+        page_size = settings.KONTEXT_PAGE_SIZE
+    if max_lines is not None:
+        page_size = min(page_size, max_lines)
+
+    first_page = poll_until_ready(lambda: _fetch_first_page(session, op_id, page_size), min_lines=max_lines)
+    if meta is not None:
+        meta.update((key, value) for key, value in first_page.items() if key != "Lines")
+    page = first_page["Lines"]
+
+    yielded = 0
+    page_number = 1
+    while True:
+        lines_on_page = 0
+        for line in page:
+            yield line
+            lines_on_page += 1
+            yielded += 1
+            if max_lines is not None and yielded >= max_lines:
+                return
+        if lines_on_page < page_size:  # the last page
+            return
+        page_number += 1
+        page = _iter_page_lines(session, op_id, page_size, page_number)
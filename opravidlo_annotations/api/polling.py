@@ -0,0 +1,66 @@
+"""
+Waiting for concordances which are computed asynchronously by the server.
+
+Both Kontext ("async": True) and Sketch Engine ("asyn": 1) return the first results before the whole concordance
+is computed and mark the response with "finished". Reading such a response immediately may give partial
+or empty "Lines", so the request is repeated with exponential backoff until it is complete enough.
+"""
+import logging
+import time
+from collections.abc import Callable
+
+from opravidlo_annotations import settings
+
+logging.basicConfig(level=logging.INFO)
+
+
+def is_concordance_ready(result: dict, min_lines: int = None) -> bool:
+    """
+    Check whether the response can be used.
+
+    Args:
+        result (dict): Concordances in JSON.
+        min_lines (int, optional): The number of lines which is enough even if the computation is not finished.
+                                   None means the computation has to be finished.
+
+    Returns:
+        bool: True if the computation is finished, at least min_lines lines are available, or the server returned
+        an error (there is nothing to wait for).
+    """
+    if "error" in result or result.get("finished", True):   # responses without the flag are complete
+        return True
+    available_lines = max(len(result.get("Lines", [])), result.get("concsize", 0))   # concsize = computed so far
+    return min_lines is not None and available_lines >= min_lines
+
+
+def poll_until_ready(fetch: Callable[[], dict], min_lines: int = None, initial_delay: float = None,
+                     max_delay: float = None, timeout: float = None) -> dict:
+    """
+    Call fetch() until its response is ready (see is_concordance_ready) or until the timeout elapses.
+    The delay between the calls starts at initial_delay and doubles up to max_delay.
+
+    Args:
+        fetch: Function without arguments which requests the concordance.
+        min_lines: The number of lines which is enough even if the computation is not finished.
+        initial_delay: Seconds before the second call. Defaults to settings.POLL_INITIAL_DELAY.
+        max_delay: The longest delay between two calls. Defaults to settings.POLL_MAX_DELAY.
+        timeout: Seconds after which the last response is returned, even if it is not ready.
+                 Defaults to settings.POLL_TIMEOUT.
+
+    Returns:
+        dict: The last response; if it is still not ready after the timeout, it is marked with "timed_out": True.
+    """
+    delay = settings.POLL_INITIAL_DELAY if initial_delay is None else initial_delay
+    max_delay = settings.POLL_MAX_DELAY if max_delay is None else max_delay
+    timeout = settings.POLL_TIMEOUT if timeout is None else timeout
+
+    deadline = time.monotonic() + timeout
+    result = fetch()
+    while not is_concordance_ready(result, min_lines):
+        if time.monotonic() + delay > deadline:
+            logging.info(f"Concordance is still not finished after {timeout} s, using {len(result.get('Lines', []))} lines.")
+            return {**result, "timed_out": True}
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        result = fetch()
+    return result
@@ -0,0 +1,136 @@
+"""
+Client-side rate limiting for the corpus APIs.
+
+The per-second limit is enforced by a token bucket shared by all threads of the process.
+The per-day limit is enforced by a small JSON ledger on disk, which is shared by all processes.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from opravidlo_annotations.utils.file_lock import file_lock
+
+logging.basicConfig(level=logging.INFO)
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when the daily request quota is used up and the caller does not want to wait."""
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second on average with bursts of up to `capacity` requests.
+    It is thread-safe.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """
+        Take one token, block until one is available.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class DailyQuota:
+    """
+    Persistent counter of requests made today. The counter is stored in a JSON file and protected by a file lock,
+    so it is shared by all processes running on the machine. The counter resets with a new (local) day.
+    """
+
+    def __init__(self, ledger_path: Path, limit: int):
+        self.ledger_path = Path(ledger_path)
+        self.limit = limit
+
+    def _read_count(self) -> int:
+        try:
+            with open(self.ledger_path, "r", encoding="utf-8") as f:
+                ledger = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        if ledger.get("date") != date.today().isoformat():
+            return 0
+        return ledger.get("count", 0)
+
+    def _write_count(self, count: int) -> None:
+        with open(self.ledger_path, "w", encoding="utf-8") as f:
+            json.dump({"date": date.today().isoformat(), "count": count}, f)
+
+    def remaining(self) -> int:
+        """
+        Returns: The number of requests which can still be made today.
+        """
+        with file_lock(self.ledger_path):
+            return max(0, self.limit - self._read_count())
+
+    def consume(self, wait: bool = False) -> None:
+        """
+        Record one request in the ledger.
+
+        Args:
+            wait (bool): If the quota is used up, sleep until the next day instead of raising an error.
+
+        Raises:
+            QuotaExceededError: If the quota is used up and wait is False.
+        """
+        while True:
+            with file_lock(self.ledger_path):
+                count = self._read_count()
+                if count < self.limit:
+                    self._write_count(count + 1)
+                    return
+            if not wait:
+                raise QuotaExceededError(f"Daily quota of {self.limit} requests is used up, "
+                                         f"ledger: '{self.ledger_path}'.")
+            tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+            seconds_to_tomorrow = (tomorrow - datetime.now()).total_seconds()
+            logging.info(f"Daily quota of {self.limit} requests is used up, waiting {seconds_to_tomorrow:.0f} s.")
+            time.sleep(max(1.0, seconds_to_tomorrow))
+
+
+class RateLimiter:
+    """
+    Combination of the per-second token bucket and the per-day quota. Call `acquire()` before every request.
+    """
+
+    def __init__(self, requests_per_second: float, requests_per_day: int, ledger_path: Path,
+                 wait_on_quota: bool = False):
+        self.bucket = TokenBucket(requests_per_second)
+        self.quota = DailyQuota(ledger_path, requests_per_day)
+        self.wait_on_quota = wait_on_quota
+
+    def acquire(self) -> None:
+        """
+        Block until a request is allowed by both limits and record it.
+
+        Raises:
+            QuotaExceededError: If the daily quota is used up and the limiter is not set to wait.
+        """
+        self.quota.consume(wait=self.wait_on_quota)
+        self.bucket.acquire()
+
+    def remaining(self) -> int:
+        """
+        Returns: The number of requests which can still be made today.
+        """
+        return self.quota.remaining()
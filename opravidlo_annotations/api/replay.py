@@ -0,0 +1,139 @@
+"""
+Recording of the real API responses into fixture files and their offline replay.
+
+RecordingAdapter forwards the requests to the servers and saves every response into the fixtures directory.
+ReplayAdapter serves the saved responses without any network access, optionally with added latency and errors,
+so the whole pipeline can be run and measured offline (see benchmark.py). The Kontext login is not replayed
+but always succeeds: it is recorded only when the stored cookies were not valid, and its cookies are never saved.
+
+Install an adapter with api.transport.set_transport_adapter.
+"""
+import hashlib
+import json
+import random as rd
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+SECRET_FIELDS = {"personal_access_token"}   # left out of the fixture keys, so the fixtures do not depend on the token
+SECRET_HEADERS = {"set-cookie", "authorization"}    # never stored in the fixtures
+BODY_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}  # the body is stored decoded
+LOGIN_URLS = {("korpus.cz", "/login")}     # (host, path) of the logins which ReplayAdapter lets pass
+
+
+def _normalise_body(request: requests.PreparedRequest) -> str:
+    """
+    Returns: The body of the request in a canonical form without secrets.
+    """
+    body = request.body
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    except json.JSONDecodeError:
+        return json.dumps(sorted((key, value) for key, value in parse_qsl(body) if key not in SECRET_FIELDS),
+                          ensure_ascii=False)
+
+
+def fixture_key(request: requests.PreparedRequest) -> str:
+    """
+    Returns: Hash identifying the request by its method, URL path, query parameters and body.
+    """
+    url = urlsplit(request.url)
+    params = sorted(parse_qsl(url.query))
+    raw_key = json.dumps([request.method, url.netloc, url.path.replace("//", "/"), params, _normalise_body(request)],
+                         ensure_ascii=False)
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Transport adapter sending the requests to the real servers and saving the responses as fixtures.
+    """
+
+    def __init__(self, fixtures_dir: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures_dir = Path(fixtures_dir)
+        self.fixtures_dir.mkdir(parents=True, exist_ok=True)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        response = super().send(request, **kwargs)
+        fixture = {
+            "method": request.method,
+            "url": request.url,
+            "status_code": response.status_code,
+            "headers": {key: value for key, value in response.headers.items()
+                        if key.lower() not in SECRET_HEADERS and key.lower() not in BODY_HEADERS},
+            "body": response.content.decode(response.encoding or "utf-8"),
+        }
+        with open(self.fixtures_dir / f"{fixture_key(request)}.json", "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter serving the recorded fixtures instead of the network.
+
+    Args:
+        fixtures_dir: Directory with the recorded fixtures.
+        latency: Seconds added to every response.
+        latency_jitter: Up to this many seconds are randomly added to the latency.
+        error_rate: Probability (0-1) that a request fails with HTTP 503 instead of being served.
+        connection_error_rate: Probability (0-1) that a request fails with a connection error.
+        seed: Seed of the random generator for the jitter and the errors, so the runs can be repeated.
+    """
+
+    def __init__(self, fixtures_dir: Path, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, connection_error_rate: float = 0.0, seed: int = None):
+        super().__init__()
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.connection_error_rate = connection_error_rate
+        self.random = rd.Random(seed)
+
+    def _build_response(self, request: requests.PreparedRequest, status_code: int, headers: dict,
+                        body: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body.encode("utf-8")
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        url = urlsplit(request.url)
+        if (url.netloc, url.path) in LOGIN_URLS:
+            return self._build_response(request, 200, {}, "")
+
+        time.sleep(self.latency + self.random.uniform(0, self.latency_jitter))
+
+        if self.random.random() < self.connection_error_rate:
+            raise requests.ConnectionError(f"Injected connection error: {request.method} {request.url}",
+                                           request=request)
+        if self.random.random() < self.error_rate:
+            return self._build_response(request, 503, {}, "Injected error.")
+
+        path = self.fixtures_dir / f"{fixture_key(request)}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+        except FileNotFoundError:
+            return self._build_response(request, 404, {}, f"No fixture recorded for: {request.method} {request.url}")
+
+        return self._build_response(request, fixture["status_code"], fixture["headers"], fixture["body"])
+
+    def close(self) -> None:
+        pass
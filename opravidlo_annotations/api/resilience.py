@@ -0,0 +1,154 @@
+"""
+Retries with backoff and a circuit breaker for the HTTP calls to the corpus APIs.
+
+A failed call (connection error, timeout, HTTP 429 or 5xx) is repeated up to settings.HTTP_MAX_RETRIES times.
+The delay grows exponentially with random jitter, unless the server says how long to wait in the Retry-After header
+(at most settings.HTTP_MAX_RETRY_AFTER seconds are waited).
+Every backend has its own circuit breaker: after settings.CIRCUIT_FAILURE_THRESHOLD consecutive failed calls
+the backend is considered down and further calls fail immediately for settings.CIRCUIT_RESET_TIMEOUT seconds.
+"""
+import logging
+import random as rd
+import threading
+import time
+from collections.abc import Callable
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from opravidlo_annotations import settings
+
+logging.basicConfig(level=logging.INFO)
+
+RETRIED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised when a call is refused because the backend has failed too many times in a row."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one backend. It is thread-safe.
+    """
+
+    def __init__(self, backend: str, failure_threshold: int, reset_timeout: float):
+        self.backend = backend
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open. After reset_timeout, one trial call is let through.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Backend '{self.backend}' is unavailable after {self._failures} failed calls, "
+                                       f"not calling it for {self.reset_timeout} s.")
+            self._opened_at = time.monotonic()     # half-open: let this call through, block the others
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(backend: str) -> CircuitBreaker:
+    """
+    Returns: The circuit breaker of the backend, shared by the whole process.
+    """
+    with _circuit_breakers_lock:
+        if backend not in _circuit_breakers:
+            _circuit_breakers[backend] = CircuitBreaker(backend, settings.CIRCUIT_FAILURE_THRESHOLD,
+                                                        settings.CIRCUIT_RESET_TIMEOUT)
+        return _circuit_breakers[backend]
+
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    """
+    Returns: The delay requested by the Retry-After header (in seconds or as an HTTP date), or None.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """
+    Returns: Exponential delay with full jitter for the given attempt (counted from 0).
+    """
+    return rd.uniform(0, min(settings.HTTP_MAX_BACKOFF, settings.HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def call_with_retries(backend: str, send: Callable[..., requests.Response], *args, **kwargs) -> requests.Response:
+    """
+    Call send(*args, **kwargs) and repeat it if it fails transiently.
+    If no timeout is passed, the timeout of the backend from settings.HTTP_TIMEOUTS is used.
+
+    Args:
+        backend: "kontext" or "sketch"; it selects the timeout and the circuit breaker
+        send: Function sending one HTTP request, e.g. requests.get or session.request
+        *args, **kwargs: Passed to send.
+
+    Returns:
+        The response. It can still be an error response if the retries are used up, so call raise_for_status().
+
+    Raises:
+        CircuitOpenError: If the backend has been failing and the call is not attempted.
+        requests.ConnectionError, requests.Timeout: If the last attempt fails with them.
+    """
+    kwargs.setdefault("timeout", settings.HTTP_TIMEOUTS[backend])
+    circuit_breaker = get_circuit_breaker(backend)
+
+    for attempt in range(settings.HTTP_MAX_RETRIES + 1):
+        circuit_breaker.before_call()
+        is_last_attempt = attempt == settings.HTTP_MAX_RETRIES
+        try:
+            response = send(*args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            circuit_breaker.record_failure()
+            if is_last_attempt:
+                raise
+            delay = _backoff_delay(attempt)
+            logging.info(f"Request to {backend} failed: '{e}', retrying in {delay:.1f} s.")
+            time.sleep(delay)
+            continue
+
+        if response.status_code not in RETRIED_STATUS_CODES:
+            circuit_breaker.record_success()
+            return response
+
+        circuit_breaker.record_failure()
+        if is_last_attempt:
+            return response
+        response.close()    # release the connection back to the pool, the response is not used
+        delay = _retry_after_seconds(response)
+        if delay is None:
+            delay = _backoff_delay(attempt)
+        delay = min(delay, settings.HTTP_MAX_RETRY_AFTER)
+        logging.info(f"Request to {backend} returned {response.status_code}, retrying in {delay:.1f} s.")
+        time.sleep(delay)
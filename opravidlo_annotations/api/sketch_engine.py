@@ -1,25 +1,183 @@
 """
 Sketch engine API documentation: https://www.sketchengine.eu/documentation/api-documentation/
 """
+import logging
+import math
+import random as rd
+from collections.abc import Iterator
+
 import requests
 
 from opravidlo_annotations import settings
+from opravidlo_annotations.api.json_stream import iter_json_array
+from opravidlo_annotations.api.polling import poll_until_ready
+from opravidlo_annotations.api.rate_limit import RateLimiter
+from opravidlo_annotations.api.resilience import call_with_retries
+from opravidlo_annotations.api.transport import new_session
+
+logging.basicConfig(level=logging.INFO)
+base_url = "https://api.sketchengine.eu/bonito/run.cgi/concordance"
+
+rate_limiter = RateLimiter(settings.SKETCH_REQUESTS_PER_SECOND, settings.SKETCH_REQUESTS_PER_DAY,
+                           settings.SKETCH_QUOTA_LEDGER, wait_on_quota=settings.SKETCH_WAIT_ON_QUOTA)
+
 
+def _get(session: requests.Session, url: str, **kwargs) -> requests.Response:
+    """
+    Send a single GET request to Sketch Engine as soon as the rate limiter allows it.
+    """
+    rate_limiter.acquire()
+    return session.get(url, **kwargs)
 
-def get_concordances_from_sketch(corpus_name: str, query: str, number_of_concordances: int) -> dict:
-    base_url = "https://api.sketchengine.eu/bonito/run.cgi/concordance"
 
-    params = {
+def _concordance_params(corpus_name: str, query: str, number_of_concordances: int, page_number: int,
+                        sample_size: int | None) -> dict:
+    operations = [f'q{query}']
+    if sample_size is not None:
+        operations.append(f"r{sample_size}")
+
+    return {
         "corpname": f"preloaded/{corpus_name}",
-        "q": f'q{query}',
+        "q": operations,
         "pagesize": number_of_concordances,
+        "fromp": page_number,
         "kwicleftctx": -20,
         "kwicrightctx": 20,
+        "attrs": "word",        # only the attributes and structures which are really used are returned
+        "ctxattrs": "word",
+        "structs": "",
+        "refs": "",
         "qtype": "cql",
         "format": "json",
         "asyn": 1
     }
 
-    response = requests.get(base_url, params=params, auth=(settings.SKETCH_ENGINE_USERNAME, settings.SKETCH_ENGINE_TOKEN))
+
+def get_concordances_from_sketch(corpus_name: str, query: str, number_of_concordances: int, page_number: int = 1,
+                                 sample_size: int = None) -> dict:
+    """
+    Fetch the concordances in JSON format.
+
+    Args:
+        corpus_name (str): corpus name, e.g. "cstenten_all_mj2".
+        query (str): CQL query.
+        number_of_concordances (int): the number of displayed concordances (page size).
+        page_number (int, optional): which page of the size number_of_concordances to fetch, starting from 1.
+        sample_size (int, optional): let the server reduce the concordance to a random sample of this size.
+
+    Returns:
+        dict: Concordances in JSON.
+    """
+    params = _concordance_params(corpus_name, query, number_of_concordances, page_number, sample_size)
+    with new_session() as session:
+        response = call_with_retries("sketch", _get, session, base_url, params=params,
+                                     auth=(settings.SKETCH_ENGINE_USERNAME, settings.SKETCH_ENGINE_TOKEN))
     response.raise_for_status()
     return response.json()
+
+
+def iter_concordances_from_sketch(corpus_name: str, query: str, number_of_concordances: int, page_number: int = 1,
+                                  sample_size: int = None, meta: dict = None) -> Iterator[dict]:
+    """
+    Yield the concordance lines one by one while the response is being downloaded and parsed,
+    so only one line at a time is held in memory. The arguments are the same as in get_concordances_from_sketch;
+    the other fields of the response (e.g. "finished", "concsize" and "error") are stored into meta if it is given.
+
+    Yields:
+        dict: One concordance line from the "Lines" list of the response.
+    """
+    params = _concordance_params(corpus_name, query, number_of_concordances, page_number, sample_size)
+    with new_session() as session:
+        response = call_with_retries("sketch", _get, session, base_url, params=params, stream=True,
+                                     auth=(settings.SKETCH_ENGINE_USERNAME, settings.SKETCH_ENGINE_TOKEN))
+        with response:
+            response.raise_for_status()
+            yield from iter_json_array(response.iter_content(chunk_size=settings.STREAM_CHUNK_SIZE), "Lines", meta)
+
+
+def _fetch_ready_page(corpus_name: str, query: str, number_of_concordances: int, page_number: int = 1,
+                      sample_size: int = None, min_lines: int = None) -> dict:
+    """
+    Fetch a page of the concordance with its "Lines" and the other fields of the response. Its "finished"
+    and "concsize" fields tell whether the concordance is still being computed; only then the page is requested
+    again until it is finished or has at least min_lines lines (see api/polling.py), so a finished concordance
+    costs no extra request.
+
+    Returns:
+        dict: The last response; it tells the size of the concordance or the error, see poll_until_ready.
+    """
+    def fetch() -> dict:
+        meta = {}
+        lines = list(iter_concordances_from_sketch(corpus_name, query, number_of_concordances, page_number,
+                                                   sample_size, meta))
+        return {**meta, "Lines": lines}
+
+    return poll_until_ready(fetch, min_lines=min_lines)
+
+
+def _iter_scattered_pages_from_sketch(corpus_name: str, query: str, number_of_concordances: int,
+                                      number_of_pages: int = 4, meta: dict = None) -> Iterator[dict]:
+    """
+    Yield number_of_concordances concordance lines from a few small pages picked at random positions
+    of the concordance. The first page is fetched (and polled) to learn the size of the concordance and it is
+    used if it is picked.
+
+    Args:
+        corpus_name (str): corpus name, e.g. "cstenten_all_mj2".
+        query (str): CQL query.
+        number_of_concordances (int): the number of concordances to fetch in total.
+        number_of_pages (int, optional): into how many pages the concordances are split.
+        meta (dict, optional): the other fields of the first page are stored into it.
+
+    Yields:
+        dict: One concordance line.
+    """
+    page_size = math.ceil(number_of_concordances / number_of_pages)
+    first_page = _fetch_ready_page(corpus_name, query, page_size)
+    if meta is not None:
+        meta.update((key, value) for key, value in first_page.items() if key != "Lines")
+    total_pages = max(1, math.ceil(first_page.get("concsize", 0) / page_size))
+    page_numbers = sorted(rd.sample(range(1, total_pages + 1), min(number_of_pages, total_pages)))
+
+    yielded = 0
+    for page_number in page_numbers:
+        page = first_page["Lines"] if page_number == 1 else \
+            iter_concordances_from_sketch(corpus_name, query, page_size, page_number)
+        for line in page:
+            yield line
+            yielded += 1
+            if yielded >= number_of_concordances:
+                return
+
+
+def iter_random_sample_from_sketch(corpus_name: str, query: str, number_of_concordances: int,
+                                   meta: dict = None) -> Iterator[dict]:
+    """
+    Yield a random sample of the concordance lines. The server is asked to sample exactly number_of_concordances
+    lines; if the sampling fails, a few pages from random positions of the concordance are downloaded instead.
+    The sample is requested again while the server has not computed enough lines (see api/polling.py).
+
+    Args:
+        corpus_name (str): corpus name, e.g. "cstenten_all_mj2".
+        query (str): CQL query.
+        number_of_concordances (int): the size of the sample.
+        meta (dict, optional): the other fields of the response with the sample (or of the first scattered page),
+                               e.g. "concsize", or "timed_out" if the polling gave up (see poll_until_ready),
+                               are stored into it.
+
+    Yields:
+        dict: One concordance line.
+    """
+    try:
+        result = _fetch_ready_page(corpus_name, query, number_of_concordances, sample_size=number_of_concordances,
+                                   min_lines=number_of_concordances)
+        if "error" not in result:
+            if meta is not None:
+                meta.update((key, value) for key, value in result.items() if key != "Lines")
+            yield from result["Lines"]
+            return
+        logging.info(f"Random sample is not available: '{result['error']}', fetching scattered pages instead.")
+    except requests.HTTPError as e:
+        logging.info(f"Random sample is not available: '{e}', fetching scattered pages instead.")
+
+    yield from _iter_scattered_pages_from_sketch(corpus_name, query, number_of_concordances, meta=meta)
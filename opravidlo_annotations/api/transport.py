@@ -0,0 +1,33 @@
+"""
+Creation of the HTTP sessions used by the API modules.
+
+By default the sessions talk to the real servers. A different transport adapter (e.g. the recorder or the offline
+replay from api/replay.py) can be installed with set_transport_adapter; all sessions created afterward use it.
+"""
+import requests
+from requests.adapters import BaseAdapter
+
+_transport_adapter = None
+
+
+def set_transport_adapter(adapter: BaseAdapter | None) -> None:
+    """
+    Use the adapter for all HTTP(S) requests of the sessions created from now on. None restores the default transport.
+    The shared Kontext session is dropped, so it is recreated with the new adapter.
+    """
+    global _transport_adapter
+    _transport_adapter = adapter
+
+    from opravidlo_annotations.api import kontext   # imported here, kontext itself imports this module
+    kontext.reset_session()
+
+
+def new_session() -> requests.Session:
+    """
+    Returns: A new session using the installed transport adapter (if any).
+    """
+    session = requests.Session()
+    if _transport_adapter is not None:
+        session.mount("https://", _transport_adapter)
+        session.mount("http://", _transport_adapter)
+    return session
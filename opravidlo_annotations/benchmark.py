@@ -0,0 +1,110 @@
+"""
+End-to-end benchmark of generate_concordances without the live APIs.
+
+1. Record the fixtures once (needs the tokens and network access):
+   python -m opravidlo_annotations.benchmark record --corpus-manager kontext --corpus-name syn2015 \
+       --query '[lemma="vybít"]' --target vybi --variants vyby --target-code
+2. Replay them offline as many times as needed:
+   python -m opravidlo_annotations.benchmark replay --corpus-manager kontext --corpus-name syn2015 \
+       --query '[lemma="vybít"]' --target vybi --variants vyby --target-code --runs 10 --latency 0.2
+"""
+import argparse
+import random as rd
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.api import kontext, sketch_engine
+from opravidlo_annotations.api.rate_limit import RateLimiter
+from opravidlo_annotations.api.replay import RecordingAdapter, ReplayAdapter
+from opravidlo_annotations.api.transport import set_transport_adapter
+from opravidlo_annotations.core.concordance2annotation import construct_target_variant_from_code
+from opravidlo_annotations.core.generate_concordances import generate_concordances
+
+DEFAULT_FIXTURES_DIR = settings.OPRAVIDLO_DIR / "opravidlo_annotations" / "files" / "fixtures"
+
+
+def _run_pipeline(args: argparse.Namespace) -> int:
+    """
+    Run generate_concordances once without the response cache.
+
+    Returns: The number of produced concordances.
+    """
+    rd.seed(args.seed)      # the combo shuffle and the Sketch fallback pages are then the same in every run
+    concordances = generate_concordances(args.corpus_manager, args.corpus_name, args.target, args.variants, args.query,
+                                         args.number, args.is_target_valid, args.target_code, None,
+                                         construct_target_variant_from_code if args.target_code else None,
+                                         use_cache=False)
+    return len(concordances)
+
+
+def record(args: argparse.Namespace) -> None:
+    """
+    Run the pipeline against the real APIs and save all responses into the fixtures directory.
+    """
+    set_transport_adapter(RecordingAdapter(args.fixtures_dir))
+    number_of_concordances = _run_pipeline(args)
+    set_transport_adapter(None)
+    print(f"Recorded the responses for {number_of_concordances} concordances into '{args.fixtures_dir}'.")
+
+
+def replay(args: argparse.Namespace) -> None:
+    """
+    Run the pipeline repeatedly against the recorded fixtures and print the latency and throughput.
+    """
+    set_transport_adapter(ReplayAdapter(args.fixtures_dir, args.latency, args.latency_jitter, args.error_rate,
+                                        args.connection_error_rate, args.seed))
+    # the replayed requests must not use up the real daily quota, fill the real response cache
+    # nor overwrite the real Kontext cookies
+    temporary_dir = Path(tempfile.mkdtemp())
+    kontext.cookies_file_path = temporary_dir / "cookies.pickle"
+    kontext.rate_limiter = RateLimiter(settings.KONTEXT_REQUESTS_PER_SECOND, settings.KONTEXT_REQUESTS_PER_DAY,
+                                       temporary_dir / "kontext_quota.json")
+    sketch_engine.rate_limiter = RateLimiter(settings.SKETCH_REQUESTS_PER_SECOND, settings.SKETCH_REQUESTS_PER_DAY,
+                                             temporary_dir / "sketch_quota.json")
+    settings.RESPONSE_CACHE_DIR = temporary_dir / "response_cache"
+
+    durations = []
+    total_concordances = 0
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        total_concordances += _run_pipeline(args)
+        durations.append(time.perf_counter() - start)
+    set_transport_adapter(None)
+
+    durations.sort()
+    print(f"runs: {args.runs}, concordances per run: {total_concordances / args.runs:.0f}")
+    print(f"latency [s]: mean {statistics.mean(durations):.3f}, median {statistics.median(durations):.3f}, "
+          f"p95 {durations[min(len(durations) - 1, int(0.95 * len(durations)))]:.3f}, max {durations[-1]:.3f}")
+    print(f"throughput: {total_concordances / sum(durations):.1f} concordances/s")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Record the API responses or benchmark the pipeline offline.")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--corpus-manager", required=True, choices=["kontext", "sketch", "combo"])
+    parser.add_argument("--corpus-name", default="")
+    parser.add_argument("--query", required=True)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--variants", required=True, nargs="+")
+    parser.add_argument("--target-code", action="store_true", help="the target is a code, see construct_target_from_code")
+    parser.add_argument("--is-target-invalid", dest="is_target_valid", action="store_false")
+    parser.add_argument("--number", type=int, default=100, help="number of concordances to fetch")
+    parser.add_argument("--fixtures-dir", type=Path, default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected HTTP 503")
+    parser.add_argument("--connection-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = _parse_args()
+    if arguments.mode == "record":
+        record(arguments)
+    else:
+        replay(arguments)
@@ -0,0 +1,90 @@
+"""
+Benchmark of correct_punctuation against the original chain of eight re.sub passes, which it replaced.
+Both are run on the same generated sentences; the outputs have to be identical:
+    python -m opravidlo_annotations.benchmark_punctuation
+    python -m opravidlo_annotations.benchmark_punctuation --sentences 50000 --seed 1
+
+The golden corpus of tests/test_correct_punctuation.py was generated by correct_punctuation_chain
+from generate_sentences.
+"""
+import argparse
+import random as rd
+import re
+import time
+from collections.abc import Callable
+
+from opravidlo_annotations.core.concordance2annotation import correct_punctuation
+
+_WORDS = ["Stál", "před", "jejich", "chalupou", "a", "v", "lese", "se", "to", "li", "prý", "když", "Praha", "řekl",
+          "nevybil", "baterku", "až", "do", "konce", "2,5", "km", "č.", "tzv.", "OK"]
+_PUNCTUATION = [".", ",", "?", "!", ":", ";", "...", "....", "-", "–", '"', "„", "“", "(", ")", "[", "]", "{", "}",
+                "»", "«", "‚", "‘", "°", "+", "¨", "…", "$"]
+_SPACES = [" ", " ", " ", " ", "  ", "   ", "", "\t", "\n", "  "]
+_ALPHABET = ' .-"li,„“()[]?!:;…«»‚‘°+¨$\tx'
+
+
+def correct_punctuation_chain(text: str) -> str:
+    """
+    The original implementation of correct_punctuation: the rules applied one by one.
+    """
+    three_dots_corrected = re.sub(r'\.\.\.', r'…', text)
+    two_spaces_corrected = re.sub(r'  ', r' ', three_dots_corrected)
+    li_corrected = re.sub(r' - li', ' -li', two_spaces_corrected)
+    dash_corrected = re.sub(r' - ', r' – ', li_corrected)
+    removed_before = re.sub(r'\s+([.,\]}?!:;“…)+¨«‘])', r"\1", dash_corrected)
+    removed_after = re.sub(r'([„\[{(»°+‚])\s+', r"\1", removed_before)
+    quotation_mark_corrected = re.sub(r'"([ $,.?!])', r"“\1", removed_after)
+    quotation_mark_corrected = re.sub(r' "', r" „", quotation_mark_corrected)
+    return quotation_mark_corrected
+
+
+def generate_sentences(number: int, seed: int = 0) -> list[str]:
+    """
+    Returns: Sentences made of words, punctuation and irregular spaces, every fourth one a random string
+    of the characters which the rules handle.
+    """
+    random = rd.Random(seed)
+    sentences = []
+    for i in range(number):
+        if i % 4 == 3:
+            sentences.append("".join(random.choices(_ALPHABET, k=random.randint(0, 30))))
+            continue
+        tokens = []
+        for _ in range(random.randint(1, 25)):
+            tokens.append(random.choice(_WORDS if random.random() < 0.6 else _PUNCTUATION))
+            tokens.append(random.choice(_SPACES))
+        sentences.append("".join(tokens))
+    return sentences
+
+
+def measure(function: Callable[[str], str], sentences: list[str], runs: int) -> tuple[list[str], float]:
+    """
+    Returns: The outputs of the function and the best time per sentence in microseconds.
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        outputs = [function(sentence) for sentence in sentences]
+        best = min(best, time.perf_counter() - start)
+    return outputs, best / len(sentences) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare correct_punctuation with the original chain of re.sub.")
+    parser.add_argument("--sentences", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5, help="the best of the runs is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    test_sentences = generate_sentences(arguments.sentences, arguments.seed)
+    expected, chain_time = measure(correct_punctuation_chain, test_sentences, arguments.runs)
+    result, single_pass_time = measure(correct_punctuation, test_sentences, arguments.runs)
+    differences = [i for i, (a, b) in enumerate(zip(expected, result)) if a != b]
+
+    print(f"chain of re.sub: {chain_time:.1f} us per sentence")
+    print(f"correct_punctuation: {single_pass_time:.1f} us per sentence ({chain_time / single_pass_time:.2f}x)")
+    if differences:
+        print(f"{len(differences)} outputs differ, e.g. {test_sentences[differences[0]]!r}: "
+              f"{expected[differences[0]]!r} != {result[differences[0]]!r}")
+        raise SystemExit(1)
+    print(f"all {len(test_sentences)} outputs are identical")
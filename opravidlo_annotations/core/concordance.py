@@ -0,0 +1,54 @@
+"""
+Concordance record which keeps the position of the KWIC (the tokens matched by the query) in the concordance text.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from opravidlo_annotations.api.cache import normalise_query
+
+
+def make_query_id(query: str) -> str:
+    """
+    Returns: Short identifier of the CQL query; queries differing only in formatting have the same one.
+    """
+    return hashlib.sha256(normalise_query(query).encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(frozen=True, slots=True)
+class Concordance:
+    """
+    One concordance: the text (left context, KWIC and right context joined by spaces),
+    the character offsets of the KWIC in the text and where the concordance comes from.
+    Create it with from_tokens.
+    """
+    text: str
+    kwic_start: int
+    kwic_end: int
+    corpus_name: str = ""
+    query_id: str = ""
+
+    @classmethod
+    def from_tokens(cls, left: list[str], kwic: list[str], right: list[str], corpus_name: str = "",
+                    query_id: str = "") -> "Concordance":
+        """
+        Join the tokens into the text the same way as " ".join(left + kwic + right) and remember the KWIC offsets.
+        """
+        left_text, kwic_text, right_text = " ".join(left), " ".join(kwic), " ".join(right)
+        kwic_start = len(left_text) + 1 if left_text and kwic_text else len(left_text)
+        text = " ".join(part for part in (left_text, kwic_text, right_text) if part)
+        return cls(text, kwic_start, kwic_start + len(kwic_text), corpus_name, query_id)
+
+    @property
+    def left(self) -> str:
+        return self.text[:self.kwic_start].rstrip(" ")
+
+    @property
+    def kwic(self) -> str:
+        return self.text[self.kwic_start:self.kwic_end]
+
+    @property
+    def right(self) -> str:
+        return self.text[self.kwic_end:].lstrip(" ")
+
+    def __str__(self) -> str:
+        return self.text
@@ -2,26 +2,202 @@ import re
 import logging
 import random as rd
 from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from typing import TYPE_CHECKING
 
-import nltk
+from opravidlo_annotations import settings
+from opravidlo_annotations.core.concordance import Concordance
 
-nltk.download("punkt")
+if TYPE_CHECKING:
+    from nltk.tokenize.punkt import PunktSentenceTokenizer
 
 logging.basicConfig(level=logging.INFO)
 
+
+@lru_cache(maxsize=1024)
+def _literal_pattern(target: str) -> re.Pattern:
+    """
+    Returns: Compiled case-insensitive regexp matching the target literally.
+    """
+    return re.compile(re.escape(target), flags=re.IGNORECASE)
+
+
+def _search_target(pattern: re.Pattern, concordance: str | Concordance) -> re.Match | None:
+    """
+    Search for the target in the KWIC of the concordance (including the space before and the character after it),
+    or in the whole text if the concordance is a plain string or the target is not in the KWIC.
+    """
+    if isinstance(concordance, Concordance):
+        match = pattern.search(concordance.text, max(concordance.kwic_start - 1, 0), concordance.kwic_end + 1)
+        if match:
+            return match
+        concordance = concordance.text
+    return pattern.search(concordance)
+
+
+@lru_cache(maxsize=1024)
+def _annotation_pattern(target: str, rest: str) -> re.Pattern:
+    """
+    Returns: Compiled regexp matching the target (preceded by a space or at the start) followed by the rest.
+    """
+    return re.compile(rf"(?:^| ){re.escape(target)}{re.escape(rest)}", flags=re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class AnnotationPlan:
+    """
+    Everything about the annotation which does not change from one concordance to another, prepared once per run:
+    the compiled target pattern and the validated variants with their cumulative weights.
+    Create it with create_annotation_plan.
+    """
+    target: str
+    variants: tuple[str, ...]
+    is_target_valid: bool
+    is_target_code: bool
+    target_pattern: re.Pattern
+    cumulative_weights: tuple[float, ...] | None
+    construct_target_variant: Callable[[str, str], str] | None
+
+    def choose_variant(self, rng: rd.Random = None) -> str:
+        """
+        Pick a variant at random, respecting the weights.
+
+        Args:
+            rng: random generator to use; defaults to the global one of the random module.
+        """
+        rng = rng or rd
+        if self.cumulative_weights is None:
+            return rng.choice(self.variants)
+        return rng.choices(self.variants, cum_weights=self.cumulative_weights, k=1)[0]
+
+    def locate_target(self, concordance: str | Concordance) -> tuple[str, str, int] | tuple[None, None, None]:
+        """
+        Find the target in the concordance. For a Concordance, only its KWIC is searched (unless the target is not there).
+
+        Returns: The target, the rest after it (space or punctuation mark) and the index of the target in the text,
+        or (None, None, None) if the target code is not found.
+
+        Raises:
+            AttributeError: If the target is not a code and it is not found.
+        """
+        if self.is_target_code:
+            return _construct_target_from_code(self.target, concordance, self.target_pattern)
+        match = _search_target(self.target_pattern, concordance)
+        if match is None:
+            raise AttributeError("You probably have wrongly set query and/or target. Check it.", concordance)
+        return self.target, str(concordance)[match.end()], match.start()
+
+
+def create_annotation_plan(target: str, variants: list[str], is_target_valid: bool, is_target_code: bool,
+                           variants_weights: list[float] = None,
+                           construct_target_variant: Callable[[str, str], str] = None) -> AnnotationPlan:
+    """
+    Validate the annotation settings and precompile everything which can be reused for all concordances.
+
+    Args:
+        target: the target word / phrase (a regexp), or the target code if is_target_code is True
+        variants: other possible words or phrases which could occur at the same place as target
+        is_target_valid: whether the target is orthographically correct or not
+        is_target_code: whether the target is a code (see construct_target_from_code)
+        variants_weights: list of weights to change the distribution of variants
+        construct_target_variant: function which - if is passed - is applied to target_variant and changes it
+
+    Returns: The plan.
+
+    Raises:
+        ValueError: If there are no variants or the variants and their weights have different length.
+    """
+    if not variants:
+        raise ValueError("No target variants given.")
+    cumulative_weights = None
+    if variants_weights is not None:
+        if len(variants) != len(variants_weights):
+            raise ValueError(f"Target variants and weights do not match, they have different length."
+                             f"Variants: {len(variants)}, Weights: {len(variants_weights)}")
+        cumulative_weights = tuple(accumulate(variants_weights))
+
+    target_pattern = _code_pattern(target) if is_target_code else re.compile(target, flags=re.IGNORECASE)
+    return AnnotationPlan(target, tuple(variants), is_target_valid, is_target_code, target_pattern,
+                          cumulative_weights, construct_target_variant)
+
+
+# characters which must not be preceded, respectively followed, by whitespace
+_NO_SPACE_BEFORE = frozenset(".,]}?!:;“…)+¨«‘")
+_NO_SPACE_AFTER = frozenset("„[{(»°+‚")
+_AFTER_CLOSING_QUOTE = frozenset(" $,.?!")
+# only the places where correct_punctuation can change something:
+# a whitespace run which is long, is followed/preceded by one of the above, or separates "-" and "li";
+# three or more dots; a hyphen between spaces; a straight double quote.
+# The pattern starts with a character class, so the regex engine skips quickly over the other characters.
+_punctuation_pattern = re.compile(r'[\s."\-]'
+                                  r'(?:(?<=\s)(?<!\s\s)(?:\s+|(?=[.,\]}?!:;“…)+¨«‘])|(?<=[„\[{(»°+‚]\s)|(?<=-\s)(?=li))'
+                                  r'|(?<=\.)\.\.+'
+                                  r'|(?<= -)(?= )'
+                                  r'|(?<="))')
+_whitespace_pattern = re.compile(r"\s*")
+
+
 def correct_punctuation(text: str) -> str:
     """
-    Corrects punctuation in a string. Corrects multiple typographical details.
+    Corrects punctuation in a string. Corrects multiple typographical details:
+    "..." -> "…", double spaces -> single, " - li" -> " -li", " - " -> " – ", no spaces before closing
+    and after opening punctuation, straight double quotes -> „ and “.
+
+    All the rules are applied in a single scan of the text. The result is the same as of applying them one by one
+    in the order above (each rule applied to the result of the previous one).
     """
-    three_dots_corrected = re.sub(r'\.\.\.', r'…', text)
-    two_spaces_corrected = re.sub(r'  ', r' ', three_dots_corrected)
-    li_corrected = re.sub(r' - li', ' -li', two_spaces_corrected)
-    dash_corrected = re.sub(r' - ', r' – ', li_corrected)
-    removed_before = re.sub(r'\s+([.,\]}?!:;“…)+¨«‘])', r"\1", dash_corrected)
-    removed_after = re.sub(r'([„\[{(»°+‚])\s+', r"\1", removed_before)
-    quotation_mark_corrected = re.sub(r'"([ $,.?!])', r"“\1", removed_after)
-    quotation_mark_corrected = re.sub(r' "', r" „", quotation_mark_corrected)
-    return quotation_mark_corrected
+    last_dash = None    # position of the last hyphen replaced by a dash
+
+    def replace(match: re.Match) -> str:
+        nonlocal last_dash
+        start, end = match.span()
+        first_char = text[start]
+
+        if first_char.isspace():
+            if end < len(text) and text[end] in _NO_SPACE_BEFORE:
+                return ""
+            if start > 0 and text[start - 1] in _NO_SPACE_AFTER:
+                return ""
+            run = match.group()
+            if text[start - 1:start] == "-" and text[start - 2:start - 1] == " " and run in (" ", "  ") \
+                    and text.startswith("li", end):
+                return ""   # " - li" -> " -li"
+            return run.replace("  ", " ")
+
+        if first_char == ".":
+            return "…" * ((end - start) // 3) + "." * ((end - start) % 3)
+
+        if first_char == "-":
+            if text.startswith(" li", end) or text.startswith("  li", end):
+                return "-"  # " - li" is handled by the space after the hyphen
+            if last_dash is not None and text[last_dash + 1:start] in (" ", "  "):
+                return "-"  # the space before was already used as the space after the previous dash
+            last_dash = start
+            return "–"
+
+        # quote: closing if followed by a space or punctuation (after the spaces before punctuation are removed)
+        run_end = _whitespace_pattern.match(text, end).end()
+        following = run_end if run_end < len(text) and text[run_end] in _NO_SPACE_BEFORE else end
+        if following < len(text) and text[following] in _AFTER_CLOSING_QUOTE \
+                and not text.startswith("...", following):
+            return "“"
+        # opening if preceded by a space (which is not removed after an opening punctuation)
+        if start > 0 and text[start - 1] == " ":
+            run_start = start - 1
+            while run_start > 0 and text[run_start - 1].isspace():
+                run_start -= 1
+            if run_start == 0 or text[run_start - 1] not in _NO_SPACE_AFTER:
+                return "„"
+        return '"'
+
+    return _punctuation_pattern.sub(replace, text)
+
+
+# beginning of the sentence, then 0-10 times any other character than „ or ( and then a big letter
+_sentence_start_pattern = re.compile(r'^[^\(„]{0,10}?([A-ZŠČŘŽŠĎŤŇ])')
+_empty_quotes_pattern = re.compile(r'^„ ?“')
 
 
 def remove_left_trailing_chars(sentence: str) -> str:
@@ -35,53 +211,212 @@ def remove_left_trailing_chars(sentence: str) -> str:
 
     Returns: Sentence without left trailing characters.
     """
-    # beginning of the sentence, then 0-10 times any other character than „ or ( and then a big letter
-    pattern = r'^[^\(„]{0,10}?([A-ZŠČŘŽŠĎŤŇ])'
-    match = re.search(pattern, sentence)
+    match = _sentence_start_pattern.search(sentence)
     if match:
         start_index = match.start(1)
         return sentence[start_index:]
-    pattern = r'^„ ?“'
-    match = re.search(pattern, sentence)
+    match = _empty_quotes_pattern.search(sentence)
     if match:
         return sentence[match.end():]
     return sentence
 
 
-def extract_sentence_with_target(concordance: str, target: str) -> str|None:
+# Czech abbreviations which the Punkt model does not know (lowercase, without the final period);
+# a period after them does not end the sentence
+CZECH_ABBREVIATIONS = frozenset({
+    "apod", "atd", "tzv", "tj", "tzn", "např", "mj", "resp", "popř", "příp", "cca", "aj", "ap", "zvl", "vč",
+    "kupř", "srov", "viz", "str", "s", "č", "odst", "písm", "sb", "zák", "obr", "tab", "kap", "r", "l", "st",
+    "stol", "tis", "mil", "mld", "kč", "hod", "min", "sek", "ul", "nám", "tř", "čp", "sv", "p", "pí", "sl",
+    "ing", "mgr", "bc", "mudr", "judr", "phdr", "rndr", "paeddr", "doc", "prof", "dr", "csc", "drsc", "ph.d",
+    "arch", "akad", "gen", "plk", "pplk", "mjr", "kpt", "npor", "por", "ppor", "o.p.s", "a.s", "s.r.o", "spol",
+    "led", "ún", "bř", "dub", "kv", "čvn", "čvc", "srp", "zář", "říj", "lis", "pros",
+})
+
+
+@lru_cache(maxsize=None)
+def _sentence_tokenizer(language: str = "czech") -> "PunktSentenceTokenizer":
+    """
+    Load the Punkt model only once, from settings.NLTK_DATA_DIR or the standard NLTK data directories.
+    The Czech model is extended with CZECH_ABBREVIATIONS.
+    nltk is imported here and not at the top of the module because its import takes long.
+
+    Raises:
+        RuntimeError: If the model is not installed, see setup_nltk.py.
+    """
+    import nltk
+    from nltk.tokenize.punkt import PunktTokenizer
+
+    if str(settings.NLTK_DATA_DIR) not in nltk.data.path:
+        nltk.data.path.insert(0, str(settings.NLTK_DATA_DIR))
+    try:
+        tokenizer = PunktTokenizer(language)
+    except LookupError as e:
+        raise RuntimeError(f"The Punkt model '{language}' is not installed. "
+                           f"Download it once by: python -m opravidlo_annotations.setup_nltk") from e
+    if language == "czech" and hasattr(tokenizer, "_params"):
+        tokenizer._params.abbrev_types.update(CZECH_ABBREVIATIONS)
+    return tokenizer
+
+
+def _locate_target(concordance: str | Concordance, target: str) -> int:
+    """
+    Returns: The start index of the target in the KWIC of the concordance. For a plain string (or if the target
+    is not in the KWIC), the occurrence closest to the middle of the text is used: the KWIC is in the middle
+    because the left and the right contexts have the same number of tokens.
+
+    Raises:
+        ValueError: If the target is not found.
+    """
+    pattern = _literal_pattern(target)
+    if isinstance(concordance, Concordance):
+        match = pattern.search(concordance.text, concordance.kwic_start, concordance.kwic_end)
+        if match:
+            return match.start()
+        concordance = concordance.text
+    middle = len(concordance) / 2
+    starts = [match.start() for match in pattern.finditer(concordance)]
+    if not starts:
+        raise ValueError(f"Target word '{target}' not found in concordance: '{concordance}'.")
+    return min(starts, key=lambda start: abs(start - middle))
+
+
+def _sentence_span(tokenizer: "PunktSentenceTokenizer", text: str,
+                   target_start: int, target_end: int) -> tuple[int, int]:
+    """
+    Find the sentence around the target as tokenizer.span_tokenize(text) would, but decide only about the nearest
+    potential sentence breaks to the left and to the right of the target instead of about all of them.
+    This uses internals of the nltk tokenizer; if they are not there (another version of nltk), the whole text
+    is tokenized instead.
+
+    Returns: The start and the end index of the sentence.
+    """
+    if not (hasattr(tokenizer, "_match_potential_end_contexts") and hasattr(tokenizer, "_lang_vars")):
+        return _sentence_span_by_tokenizing(tokenizer, text, target_start, target_end)
+
+    contexts = list(tokenizer._match_potential_end_contexts(text))     # only a regexp search, the decision is costly
+    realignment = tokenizer._lang_vars.re_boundary_realignment
+
+    start = 0
+    for match, context in reversed(contexts):
+        next_start = match.start("next_tok") if match.group("next_tok") else match.end()
+        if next_start > target_start:
+            continue
+        if tokenizer.text_contains_sentbreak(context):
+            # closing quotes or brackets after the break belong to the previous sentence
+            moved = realignment.match(text, next_start)
+            start = moved.end() if moved else next_start
+            break
+
+    end = len(text.rstrip())
+    for match, context in contexts:
+        if match.end() < target_end:
+            continue
+        if tokenizer.text_contains_sentbreak(context):
+            end = match.end()
+            next_start = match.start("next_tok") if match.group("next_tok") else match.end()
+            moved = realignment.match(text, next_start)
+            if moved:
+                end = next_start + len(moved.group(0).rstrip())
+            break
+    return start, end
+
+
+def _sentence_span_by_tokenizing(tokenizer: "PunktSentenceTokenizer", text: str,
+                                 target_start: int, target_end: int) -> tuple[int, int]:
+    """
+    Returns: The start and the end index of the sentence around the target found by tokenizer.span_tokenize(text)
+    (from the start of the sentence with the beginning of the target to the end of the one with its end).
+    """
+    spans = list(tokenizer.span_tokenize(text))
+    start = next((start for start, _ in reversed(spans) if start <= target_start), 0)
+    end = next((end for _, end in spans if end >= target_end), len(text.rstrip()))
+    return start, end
+
+
+def locate_sentence_with_target(concordance: str | Concordance, target: str,
+                                target_start: int = None) -> tuple[str, int | None]:
+    """
+    Extract the sentence with the target like extract_sentence_with_target and find where the target is in it.
+
+    Returns:
+        The sentence and the index of the target in it (None if the target was cut off with the characters
+        before the start of the sentence).
+
+    Raises:
+        ValueError: If the input is empty or the target word is not found.
+    """
+    if not concordance or not target:
+        raise ValueError("Empty input. Please provide valid concordance and target.")
+
+    target = target.strip()
+    if target_start is None:
+        target_start = _locate_target(concordance, target)
+    text = str(concordance)
+    start, end = _sentence_span(_sentence_tokenizer(), text, target_start, target_start + len(target))
+    sentence = text[start:end]
+    target_start -= start
+    if re.search(r"[”“]", sentence) and "„" not in sentence:
+        sentence = "„" + sentence
+        target_start += 1
+    without_left_chars = remove_left_trailing_chars(sentence)
+    target_start -= len(sentence) - len(without_left_chars)
+    return without_left_chars, target_start if target_start >= 0 else None
+
+
+def extract_sentence_with_target(concordance: str | Concordance, target: str, target_start: int = None) -> str|None:
     """
     Extracts a single sentence containing the target word from the given concordance text.
 
-    This function searches the provided concordance text for a sentence that includes
-    the specified target word. A sentence is assumed to end with a period, question mark,
-    or exclamation mark. If the target word is not found within any sentence, the function
-    returns None.
+    The sentence boundaries are detected by the Czech Punkt model, starting from the target and going outwards
+    only to the nearest boundaries, so the rest of the concordance is not tokenized at all.
 
     Args:
-        concordance: A string representing the text containing multiple sentences.
+        concordance: A string representing the text containing multiple sentences, or a Concordance.
         target: The word to search for within the concordance text.
+        target_start: The index of the target (the KWIC) in the concordance. If it is not given, the target is
+                      searched in the KWIC of a Concordance; in a string, the occurrence of the target closest
+                      to the middle is used.
 
     Returns:
-        A string representing the single sentence containing the target word, or None
-        if the target word is not found.
+        A string representing the single sentence containing the target word.
+
+    Raises:
+        ValueError: If the input is empty or the target word is not found.
     """
-    if not concordance or not target:
-        raise ValueError("Empty input. Please provide valid concordance and target.")
+    return locate_sentence_with_target(concordance, target, target_start)[0]
 
-    sentences = nltk.sent_tokenize(concordance)
-    for i in range(len(sentences)):
-        if re.search(r"[”“]", sentences[i]) and not re.search(r"„", sentences[i]):
-            sentences[i] = "„" + sentences[i]
-        pattern = rf"{re.escape(target.strip())}"
-        match = re.search(pattern, sentences[i], flags=re.IGNORECASE)
-        if match:
-            return remove_left_trailing_chars(sentences[i])
 
-    raise ValueError(f"Target word '{target}' not found in concordance: '{concordance}'.")
+def extract_sentences_with_targets(concordances: list[str | Concordance], targets: list[str]) -> list[str | None]:
+    """
+    Extract the sentence with the target from each concordance, see extract_sentence_with_target.
+    The Punkt model is loaded once for all of them.
+
+    Args:
+        concordances: The concordances.
+        targets: The target for each concordance.
+
+    Returns:
+        The sentences in the same order; None for the concordances which do not contain their target.
+
+    Raises:
+        ValueError: If the concordances and the targets have different length.
+    """
+    if len(concordances) != len(targets):
+        raise ValueError(f"Concordances and targets do not match, they have different length."
+                         f"Concordances: {len(concordances)}, Targets: {len(targets)}")
+    sentences = []
+    for concordance, target in zip(concordances, targets):
+        try:
+            sentences.append(locate_sentence_with_target(concordance, target)[0])
+        except ValueError as e:
+            logging.info(e)
+            sentences.append(None)
+    return sentences
 
 
 def add_annotation_to_sentence(sentence: str, target:str, rest:str, target_variants:list[str], is_target_valid:bool,
-                               variants_weights: list[float]= None, construct_target_variant: Callable[[str, str], str]=None) -> str:
+                               variants_weights: list[float]= None, construct_target_variant: Callable[[str, str], str]=None,
+                               plan: "AnnotationPlan" = None, rng: rd.Random = None, target_start: int = None) -> str:
     """
     Insert all information for the annotation into the sentence.
     If there are multiple variants of the target, one variant is chosen randomly.
@@ -93,6 +428,11 @@ def add_annotation_to_sentence(sentence: str, target:str, rest:str, target_varia
         is_target_valid: whether the target is orthographically correct or not
         variants_weights: list of weights to change the distribution of variants
         construct_target_variant: function which - if is passed - is applied to target_variant and changes it
+        plan: precompiled AnnotationPlan; if passed, its variants, weights, validity and constructor are used
+              instead of the arguments above (which are then not validated again)
+        rng: random generator used to choose the variant; defaults to the global one of the random module
+        target_start: index of the target in the sentence; if passed, only this occurrence is annotated,
+                      otherwise all occurrences of the target are
 
     Example:
         input: "Stál před jejích chalupou.", "jejích", ["jejich"], False, False
@@ -101,47 +441,82 @@ def add_annotation_to_sentence(sentence: str, target:str, rest:str, target_varia
     Returns: Annotated sentence. The resulting format is:
     beginning_of_the_sentence[*error|valid|corpus*]rest_of_the_sentence
     """
-    if variants_weights is None:
-        target_variant = rd.choice(target_variants)
+    rng = rng or rd
+    if plan is not None:
+        target_variant = plan.choose_variant(rng)
+        is_target_valid = plan.is_target_valid
+        construct_target_variant = plan.construct_target_variant
+    elif variants_weights is None:
+        target_variant = rng.choice(target_variants)
     else:
         if len(target_variants) != len(variants_weights):
             raise ValueError(f"Target variants and weights do not match, they have different length."
                              f"Variants: {len(target_variants)}, Weights: {len(variants_weights)}")
-        target_variant = rd.choices(target_variants, variants_weights, k=1)[0]  # [0] is here because choices returns a list, and we want only the string
+        target_variant = rng.choices(target_variants, variants_weights, k=1)[0]  # [0] is here because choices returns a list, and we want only the string
     if rest is None:
         rest = " "
     target = target.strip()
-    target_ready_to_regexp = rf"(?:^| ){re.escape(target)}{re.escape(rest)}"
+    target_ready_to_regexp = _annotation_pattern(target, rest)
 
     if construct_target_variant:
         target_variant = construct_target_variant(target, target_variant)
 
     if is_target_valid:
-        return re.sub(target_ready_to_regexp, f" [*{target_variant}|{target}|corpus*]{rest}", sentence, flags=re.IGNORECASE).strip()
+        annotation = f" [*{target_variant}|{target}|corpus*]{rest}"
     else:
-        return re.sub(target_ready_to_regexp, f" [*{target}|{target_variant}|corpus*]{rest}", sentence, flags=re.IGNORECASE).strip()
+        annotation = f" [*{target}|{target_variant}|corpus*]{rest}"
+
+    if target_start is not None:
+        # the match starts with the space before the target, or at the start of the sentence
+        match = target_ready_to_regexp.search(sentence, max(target_start - 1, 0))
+        if match and match.start() <= target_start:
+            return (sentence[:match.start()] + annotation + sentence[match.end():]).strip()
+    return target_ready_to_regexp.sub(annotation, sentence).strip()
 
 
-def construct_target_from_code(target_code: str, concordance: str) -> tuple[str, str] | tuple[None, None]:
+def _code_pattern(target_code: str) -> re.Pattern:
+    """
+    Returns: Compiled regexp matching the target described by target_code (see construct_target_from_code).
+    """
+    parts = target_code.split("-")
+    pattern = "".join(rf'(?:^| ){part}\w*[^\w]' for part in parts)  # this has to be changed sometimes
+    return re.compile(pattern, flags=re.IGNORECASE)
+
+
+def construct_target_from_code(target_code: str, concordance: str | Concordance,
+                               plan: "AnnotationPlan" = None) -> tuple[str, str] | tuple[None, None]:
     """
     Given target_code, create regexp and find the real target in concordance.
 
     Examples:
          target_code = "mi-mi", concordance = "S tvými kamarádkami nechci mít nic společného." -> "tvými kamarádkami "
 
+    Args:
+        target_code: the code of the target
+        concordance: the text to search in; for a Concordance, its KWIC is searched first
+        plan: precompiled AnnotationPlan; if passed, its compiled pattern is used instead of compiling target_code
+
     Returns: Ready to be used target and the rest after the target (space or punctuation mark)
 
     """
-    parts = target_code.split("-")
-    pattern = "".join(rf'(?:^| ){part}\w*[^\w]' for part in parts)  # this has to be changed sometimes
-    match = re.search(pattern, concordance, flags=re.IGNORECASE)
+    pattern = plan.target_pattern if plan is not None else _code_pattern(target_code)
+    return _construct_target_from_code(target_code, concordance, pattern)[:2]
+
+
+def _construct_target_from_code(target_code: str, concordance: str | Concordance,
+                                pattern: re.Pattern) -> tuple[str, str, int] | tuple[None, None, None]:
+    """
+    Returns: The target, the rest after it and the index of the target (without the space before it),
+    see construct_target_from_code.
+    """
+    match = _search_target(pattern, concordance)
     if match:
         target = match.group()[:-1]
         rest = match.group()[-1]
-        return target, rest
+        return target, rest, match.start() + len(target) - len(target.lstrip())
     else:
         logging.info(f"Concordance: '{concordance}' does not contain a target: '{target_code}'.")
-        return None, None
+        return None, None, None
 
 
 def construct_target_variant_from_code(target: str, target_variant_code:str) -> str:
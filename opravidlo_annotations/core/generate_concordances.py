@@ -1,142 +1,168 @@
+import logging
+import multiprocessing
 import random as rd
-import re
-from collections.abc import Callable
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 
-import requests
+from opravidlo_annotations import settings
+from opravidlo_annotations.core.concordance import Concordance, make_query_id
+from opravidlo_annotations.core.concordance2annotation import correct_punctuation, locate_sentence_with_target, \
+    add_annotation_to_sentence, AnnotationPlan
+from opravidlo_annotations.api.cache import cached_lines
+from opravidlo_annotations.utils.dedup_index import DedupIndex
 
-from opravidlo_annotations.core.concordance2annotation import correct_punctuation, extract_sentence_with_target, \
-    add_annotation_to_sentence, construct_target_from_code
-from opravidlo_annotations.api.kontext import setup_session, submit_query, fetch_concordances_by_id
-from opravidlo_annotations.api.sketch_engine import get_concordances_from_sketch
+# The API clients (and requests) are imported only in the functions which download something,
+# so the annotation functions can be imported quickly and without them.
 
 
-
-
-def _extract_kontext_text(line: dict) -> str:
-    """
-    Extract text from a Kontext concordance line.
-
-    Args:
-        line: A concordance line from Kontext
-
-    Returns:
-        Extracted text as a string
-    """
-    left = [line["Left"][0]["str"]]
-    kwic = [line["Kwic"][0]["str"]]
-    right = [line["Right"][0]["str"]]
-    return " ".join(left + kwic + right)
-
-
-def _extract_sketch_text(line: dict) -> str:
+def _extract_concordance(line: dict, corpus_name: str = "", query_id: str = "") -> Concordance:
     """
-    Extract text from a Sketch Engine concordance line.
+    Extract text from a concordance line. Kontext and Sketch Engine return the lines in the same format.
 
     Args:
-        line: A concordance line from Sketch Engine
+        line: A concordance line from Kontext or Sketch Engine
+        corpus_name: The name of the corpus the line comes from
+        query_id: The identifier of the query, see make_query_id
 
     Returns:
-        Extracted text as a string
+        Concordance with the text and the position of the KWIC
     """
     left = [item["str"] for item in line["Left"] if "str" in item]
     kwic = [item["str"] for item in line["Kwic"] if "str" in item]
     right = [item["str"] for item in line["Right"] if "str" in item]
-    return " ".join(left + kwic + right)
+    return Concordance.from_tokens(left, kwic, right, corpus_name, query_id)
 
 
-def _check_result_has_lines(result: dict, corpus_manager: str, corpus_name: str) -> None:
+def _check_result_has_lines(concordances: list[Concordance], corpus_manager: str, corpus_name: str) -> None:
     """
     Check if the result has lines and raise a consistent error message if not.
 
     Args:
-        result: The result to check
+        concordances: The concordances extracted from the result
         corpus_manager: The corpus manager used
         corpus_name: The name of the corpus
 
     Raises:
         ValueError: If the result has no lines
     """
-    if not result.get("Lines"):
+    if not concordances:
         raise ValueError(f"No concordances found in: manager: '{corpus_manager}', corpus: '{corpus_name}'."
                          f"(Are you sure that you used correct tagging system?)")
 
 
-def _fetch_kontext_concordances(corpus_name: str, query: str, number_of_concordances_to_fetch: int) -> list[str]:
+def _iter_kontext_lines(corpus_name: str, query: str, number_of_concordances_to_fetch: int,
+                        use_cache: bool = True) -> Iterator[dict]:
     """
-    Fetch concordances from a Kontext corpus.
+    Submit a query to one Kontext corpus and yield its concordance lines, or take them from the response cache.
+    It is safe to call from multiple threads, they share one authenticated session.
 
     Args:
         corpus_name: The name of the corpus
         query: The query to search for
         number_of_concordances_to_fetch: The number of concordances to fetch
+        use_cache: False bypasses the on-disk response cache
 
-    Returns:
-        A list of concordance strings
+    Yields:
+        Concordance lines in JSON
     """
-    session = setup_session()
-    op_id = submit_query(session, corpus_name, query, number_of_concordances_to_fetch, shuffle=True)
-    result = fetch_concordances_by_id(session, op_id, number_of_concordances_to_fetch)
+    def fetch_lines(meta: dict) -> Iterator[dict]:
+        from opravidlo_annotations.api.kontext import setup_session, submit_query, iter_concordances_by_id
+
+        print(f"Fetching from corpus: {corpus_name} ({number_of_concordances_to_fetch} concordances)")
+        session = setup_session()
+        op_id = submit_query(session, corpus_name, query, number_of_concordances_to_fetch, shuffle=True)
+        return iter_concordances_by_id(session, op_id, max_lines=number_of_concordances_to_fetch, meta=meta)
+
+    return cached_lines("kontext", corpus_name, query, number_of_concordances_to_fetch, fetch_lines, use_cache)
 
-    _check_result_has_lines(result, "kontext", corpus_name)
 
+def _fetch_kontext_concordances(corpus_name: str, query: str, number_of_concordances_to_fetch: int,
+                                use_cache: bool = True) -> list[Concordance]:
+    """
+    Fetch concordances from a Kontext corpus.
+
+    Args:
+        corpus_name: The name of the corpus
+        query: The query to search for
+        number_of_concordances_to_fetch: The number of concordances to fetch
+        use_cache: False bypasses the on-disk response cache
+
+    Returns:
+        A list of concordances
+    """
     concordances = []
-    for line in result["Lines"]:
-        concordances.append(_extract_kontext_text(line))
+    query_id = make_query_id(query)
+    for line in _iter_kontext_lines(corpus_name, query, number_of_concordances_to_fetch, use_cache):
+        concordances.append(_extract_concordance(line, corpus_name, query_id))
 
+    _check_result_has_lines(concordances, "kontext", corpus_name)
     return concordances
 
 
-def _fetch_sketch_concordances(corpus_name: str, query: str, number_of_concordances_to_fetch: int) -> list[str]:
+def _iter_sketch_lines(corpus_name: str, query: str, number_of_concordances_to_fetch: int,
+                       use_cache: bool = True) -> Iterator[dict]:
     """
-    Fetch concordances from a Sketch Engine corpus. If there is more than 200 of concordances, vary the results by selecting only every forth (respectively second for 100 to 200 concordances) concordance.
-    Sketch engine api does not have the option to shuffle the results, so this is the way to substitute it a bit.
+    Yield a random sample of concordance lines from a Sketch Engine corpus, or take them from the response cache.
+    The sampling is done by the server, so only the lines which are really used are downloaded.
 
     Args:
         corpus_name: The name of the corpus
         query: The query to search for
         number_of_concordances_to_fetch: The number of concordances to fetch
+        use_cache: False bypasses the on-disk response cache
 
-    Returns:
-        A list of concordance strings
+    Yields:
+        Concordance lines in JSON
     """
-    result = get_concordances_from_sketch(corpus_name, query, number_of_concordances_to_fetch)
+    from opravidlo_annotations.api.sketch_engine import iter_random_sample_from_sketch
+
+    def fetch_lines(meta: dict) -> Iterator[dict]:
+        return iter_random_sample_from_sketch(corpus_name, query, number_of_concordances_to_fetch, meta)
+
+    return cached_lines("sketch", corpus_name, query, number_of_concordances_to_fetch, fetch_lines, use_cache)
 
-    _check_result_has_lines(result, "sketch", corpus_name)
 
+def _fetch_sketch_concordances(corpus_name: str, query: str, number_of_concordances_to_fetch: int,
+                               use_cache: bool = True) -> list[Concordance]:
+    """
+    Fetch a random sample of concordances from a Sketch Engine corpus, see _iter_sketch_lines.
+
+    Args:
+        corpus_name: The name of the corpus
+        query: The query to search for
+        number_of_concordances_to_fetch: The number of concordances to fetch
+        use_cache: False bypasses the on-disk response cache
+
+    Returns:
+        A list of concordances
+    """
     concordances = []
-    counter = 0
-    if len(result["Lines"]) < 100:
-        for line in result["Lines"]:
-            concordances.append(_extract_sketch_text(line))
-        return concordances
-
-    elif len(result["Lines"]) < 200:
-        for line in result["Lines"]:
-            if counter % 2 == 0:
-                concordances.append(_extract_sketch_text(line))
-            counter += 1
-        return concordances
-
-    else:
-        for line in result["Lines"]:
-            if counter % 4 == 0:
-                concordances.append(_extract_sketch_text(line))
-            counter += 1
+    query_id = make_query_id(query)
+    for line in _iter_sketch_lines(corpus_name, query, number_of_concordances_to_fetch, use_cache):
+        concordances.append(_extract_concordance(line, corpus_name, query_id))
+
+    _check_result_has_lines(concordances, "sketch", corpus_name)
     return concordances
 
 
-def _fetch_combo_concordances(query: str, number_of_concordances_to_fetch: int) -> list[str]:
+def _fetch_combo_concordances(query: str, number_of_concordances_to_fetch: int, max_workers: int = 4,
+                              use_cache: bool = True) -> list[Concordance]:
     """
     Fetch concordances from multiple corpora from Kontext API using the "combo" approach.
+    The corpora are queried concurrently over one shared session, so the whole fetch takes about as long
+    as the slowest corpus. A failure of one corpus does not affect the others.
 
     Args:
         query: The query to search for
         number_of_concordances_to_fetch: The number of concordances to fetch
+        max_workers: The maximum number of corpora queried at the same time
+        use_cache: False bypasses the on-disk response cache
 
     Returns:
-        A list of concordance strings
+        A list of concordances
     """
-    session = setup_session()
     corpora_names = ["syn2015", "net", "syn2013pub", "parlcorp"]
     map_numbers_to_corpora = {
         "syn2015": 0.5,
@@ -150,68 +176,134 @@ def _fetch_combo_concordances(query: str, number_of_concordances_to_fetch: int)
         for name in corpora_names
     }
 
-    results = []
+    import requests
+
+    query_id = make_query_id(query)
+
+    def fetch_corpus(name: str) -> list[Concordance]:
+        lines = _iter_kontext_lines(name, query, actual_numbers_of_concordances_to_fetch_dict[name], use_cache)
+        return [_extract_concordance(line, name, query_id) for line in lines]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(fetch_corpus, name) for name in corpora_names}
+
+    # the results are collected in the order of corpora_names, not in the order of completion,
+    # so the merged list (and therefore the shuffle with a fixed seed) is deterministic
+    concordances = []
     for name in corpora_names:
         try:
-            print(
-                f"Fetching from corpus: {name} ({actual_numbers_of_concordances_to_fetch_dict[name]} concordances)")
-            op_id = submit_query(session, name, query, actual_numbers_of_concordances_to_fetch_dict[name],
-                                 shuffle=True)
-            result = fetch_concordances_by_id(session, op_id, actual_numbers_of_concordances_to_fetch_dict[name])
-            if not result["Lines"]:
-                print(f"No results from {name}")
-                continue
-            results.append(result)
-        except requests.HTTPError as e:
+            corpus_concordances = futures[name].result()
+        except requests.RequestException as e:    # HTTP errors, connection errors after retries, open circuit
             print(f"Failed for corpus '{name}': {e}")
             continue
-
-    concordances = []
-    for result in results:
-        for line in result["Lines"]:
-            concordances.append(_extract_kontext_text(line))
+        if not corpus_concordances:
+            print(f"No results from {name}")
+            continue
+        concordances.extend(corpus_concordances)
 
     rd.shuffle(concordances)
     return concordances
 
 
-def _process_and_annotate_concordances(concordances: list[str], to_be_target: str, variants: list[str], is_target_valid: bool,
-                                       is_target_regexp:bool, variants_weights: list[float] = None,
-                                       construct_target_variant: Callable[[str, str], str] = None) -> list[str]:
+def _annotate_concordances(plan: AnnotationPlan, concordances: list[str | Concordance], seed: int = None,
+                           print_lines: bool = False, index: DedupIndex = None) -> list[str]:
+    """
+    Find the target in each concordance, extract its sentence, annotate it and correct the punctuation.
+    The concordances without the target are left out. Only the occurrence of the target in the KWIC is annotated.
+
+    Args:
+        plan: the precompiled annotation
+        concordances: concordances to be annotated
+        seed: seed of the random generator which chooses the variants; None means the global generator
+        print_lines: whether to print each annotated concordance
+        index: if given, the sentences which are already in the data files are left out before annotating them
+
+    Returns:
+        Annotated concordances in the same order.
+    """
+    rng = None if seed is None else rd.Random(seed)
     processed_concordances = []
     for concordance in concordances:
-        rest = None
-
-        if is_target_regexp:
-            target, rest = construct_target_from_code(to_be_target, concordance)
-            if target is None:
-                continue
-        else:
-            target = to_be_target
-            try:
-                end_index = re.search(target, concordance, flags=re.IGNORECASE).end()
-                rest = concordance[end_index]
-            except AttributeError as e:
-                raise AttributeError("You probably have wrongly set query and/or target. Check it.", e)
-
-
-        concordance = extract_sentence_with_target(concordance, target)
-        concordance = add_annotation_to_sentence(concordance, target, rest, variants, is_target_valid,
-                                                 variants_weights, construct_target_variant)
-        concordance = correct_punctuation(concordance)
-        processed_concordances.append(concordance)
-        print(concordance)
+        target, rest, target_start = plan.locate_target(concordance)
+        if target is None:
+            continue
+        try:
+            sentence, target_start = locate_sentence_with_target(concordance, target, target_start)
+        except ValueError as e:
+            logging.info(e)
+            continue
+        if index is not None and index.contains(correct_punctuation(sentence)):
+            continue
 
-    print()
+        annotated = add_annotation_to_sentence(sentence, target, rest, list(plan.variants), plan.is_target_valid,
+                                               plan=plan, rng=rng, target_start=target_start)
+        annotated = correct_punctuation(annotated)
+        processed_concordances.append(annotated)
+        if print_lines:
+            print(annotated)
     return processed_concordances
 
 
+def _annotate_in_chunks(plan: AnnotationPlan, concordances: Iterable[str | Concordance], workers: int = 1,
+                        chunk_size: int = None, print_lines: bool = False, index: DedupIndex = None) -> Iterator[str]:
+    """
+    Annotate the concordances chunk by chunk (see _annotate_concordances) and yield them in the original order.
+    Only the current chunks are held in memory, so the concordances can come from a stream.
+
+    Every chunk has its own random generator; their seeds come from one generator seeded from the global one
+    when the iteration starts. After rd.seed(), the chosen variants are therefore the same for any number of workers.
+
+    Args:
+        plan: the precompiled annotation
+        concordances: concordances to be annotated
+        workers: the number of processes (started by "spawn", so they load the Punkt model themselves);
+                 1 means annotating in this process
+        chunk_size: the number of concordances annotated at once. Defaults to settings.ANNOTATION_CHUNK_SIZE.
+        print_lines: whether to print each annotated concordance
+        index: see _annotate_concordances; the workers open their own connections to it
+
+    Yields:
+        Annotated concordances.
+    """
+    chunk_size = settings.ANNOTATION_CHUNK_SIZE if chunk_size is None else chunk_size
+    seeds = rd.Random(rd.getrandbits(64))
+    concordances = iter(concordances)
+    chunks = iter(lambda: list(islice(concordances, chunk_size)), [])
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _annotate_concordances(plan, chunk, seeds.getrandbits(64), print_lines, index)
+        return
+
+    # the workers are spawned, not forked: a fork would copy the locks held by the other threads of this process
+    # (e.g. the download thread of the pipeline) in their current state
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()   # at most 2 chunks per worker are submitted ahead
+        for chunk in chunks:
+            pending.append(executor.submit(_annotate_concordances, plan, chunk, seeds.getrandbits(64), print_lines,
+                                           index))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _print_summary(number_of_concordances: int, number_of_annotated: int, with_index: bool = False) -> None:
+    print()
+    reason = "without the target or already in the data files" if with_index else "without the target"
+    print(f"Annotated {number_of_annotated} of {number_of_concordances} concordances "
+          f"({number_of_concordances - number_of_annotated} {reason} were left out).")
+
+
 def generate_concordances(corpus_manager: str, corpus_name: str, target: str, variants: list[str], query: str,
                           number_of_concordances_to_fetch: int, is_target_valid: bool,
                           is_target_regexp: bool, variants_weights: list[float] = None,
-                          construct_target_variant: Callable[[str, str], str] = None) -> list[str]:
+                          construct_target_variant: Callable[[str, str], str] = None,
+                          use_cache: bool = True, workers: int = 1, print_lines: bool = True,
+                          near_duplicate_threshold: float = None) -> list[str]:
     """
     Generate concordances from a corpus and annotate them.
+    It collects the output of the streaming pipeline (see core/pipeline.py) into a list.
 
     Args:
         corpus_manager (str): "sketch" or "kontext" or "combo"; "combo" means sampling from multiple corpora from kontext
@@ -246,18 +338,25 @@ def generate_concordances(corpus_manager: str, corpus_name: str, target: str, va
 
         construct_target_variant: function which - if is passed - is applied to target_variant and changes it
 
+        use_cache (bool): whether to reuse the downloaded responses stored on disk (see api/cache.py);
+                          False forces a new download
+
+        workers (int): the number of processes annotating the concordances; more than 1 pays off for thousands
+                       of concordances
+
+        print_lines (bool): whether to print each annotated concordance; if False, only a summary is printed
+
+        near_duplicate_threshold (float): if given, the annotated concordances which are near duplicates
+                                          of the previous ones (see utils/near_duplicates.py) with at least
+                                          this similarity are left out
+
     Returns:
         list[str]: List of processed and annotated concordances
     """
-    if corpus_manager == "combo":
-        concordances = _fetch_combo_concordances(query, number_of_concordances_to_fetch)
-
-    elif corpus_manager == "kontext":
-        concordances = _fetch_kontext_concordances(corpus_name, query, number_of_concordances_to_fetch)
-
-    elif corpus_manager == "sketch":
-        concordances = _fetch_sketch_concordances(corpus_name, query, number_of_concordances_to_fetch)
-    else:
-        raise ValueError(f"Unknown corpus manager: {corpus_manager}. Choose either 'sketch', 'kontext', or 'combo'.")
-    print(f"Generated {len(concordances)} concordances.")
-    return _process_and_annotate_concordances(concordances, target, variants, is_target_valid, is_target_regexp, variants_weights, construct_target_variant)
+    from opravidlo_annotations.core.pipeline import iter_annotated_concordances  # the pipeline uses this module
+
+    return list(iter_annotated_concordances(corpus_manager, corpus_name, target, variants, query,
+                                            number_of_concordances_to_fetch, is_target_valid, is_target_regexp,
+                                            variants_weights, construct_target_variant, use_cache, workers,
+                                            print_lines, deduplicate=False,
+                                            near_duplicate_threshold=near_duplicate_threshold))
@@ -0,0 +1,221 @@
+"""
+Streaming pipeline from the corpus API to the output file:
+fetch -> extract the sentence -> leave out the known sentences -> annotate -> correct the punctuation
+-> remove duplicates -> write.
+
+Every stage is a generator pulling the concordances from the previous one, so only a bounded number of them
+is in memory at any time, and each annotated line is appended to the file as soon as it is finished.
+If the run crashes, the lines written so far are kept. The download runs in a background thread and overlaps
+with the annotation; the buffer between them holds at most settings.PIPELINE_BUFFER_SIZE concordances.
+When writing to a file, the duplicates are looked up in the dedup index of all data files (utils/dedup_index.py).
+"""
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.core.concordance import Concordance, make_query_id
+from opravidlo_annotations.core.concordance2annotation import create_annotation_plan
+from opravidlo_annotations.core.generate_concordances import _annotate_in_chunks, _check_result_has_lines, \
+    _extract_concordance, _fetch_combo_concordances, _iter_kontext_lines, _iter_sketch_lines, _print_summary
+from opravidlo_annotations.utils.dedup_index import DedupIndex
+from opravidlo_annotations.utils.near_duplicates import NearDuplicateIndex, iter_without_near_duplicates
+from opravidlo_annotations.utils.stats_manifest import txt_stats
+
+
+def iter_fetched_concordances(corpus_manager: str, corpus_name: str, query: str, number_of_concordances_to_fetch: int,
+                              use_cache: bool = True) -> Iterator[Concordance]:
+    """
+    Yield the concordances from the corpus as they are downloaded.
+    Kontext and Sketch Engine sample the concordances on the server, so they are streamed. The combo results
+    are shuffled here, so they have to be downloaded completely first (which takes only the texts in memory).
+
+    Args: see generate_concordances
+
+    Yields:
+        Concordances.
+    """
+    if corpus_manager == "combo":
+        yield from _fetch_combo_concordances(query, number_of_concordances_to_fetch, use_cache=use_cache)
+        return
+
+    if corpus_manager == "kontext":
+        lines = _iter_kontext_lines(corpus_name, query, number_of_concordances_to_fetch, use_cache)
+    elif corpus_manager == "sketch":
+        lines = _iter_sketch_lines(corpus_name, query, number_of_concordances_to_fetch, use_cache)
+    else:
+        raise ValueError(f"Unknown corpus manager: {corpus_manager}. Choose either 'sketch', 'kontext', or 'combo'.")
+
+    query_id = make_query_id(query)
+    number_of_lines = 0
+    for line in lines:
+        number_of_lines += 1
+        yield _extract_concordance(line, corpus_name, query_id)
+    if not number_of_lines:
+        _check_result_has_lines([], corpus_manager, corpus_name)
+
+
+def prefetch(items: Iterable, buffer_size: int = None) -> Iterator:
+    """
+    Iterate over items in a background thread and yield them from a bounded buffer, so that producing the next
+    items (e.g. downloading them) overlaps with processing the current ones. An exception raised by the
+    producer is raised here. If the iteration is stopped early, the thread stops as well.
+
+    Args:
+        items: the items to iterate over
+        buffer_size: the maximum number of items produced ahead. Defaults to settings.PIPELINE_BUFFER_SIZE.
+    """
+    buffer_size = settings.PIPELINE_BUFFER_SIZE if buffer_size is None else buffer_size
+    buffer = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+    end = object()
+
+    def put(entry: tuple) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((end, e))
+        else:
+            put((end, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def iter_unique(lines: Iterable[str], seen: set[str] = None) -> Iterator[str]:
+    """
+    Yield the lines which were not yielded before and are not in seen. The set seen is updated.
+    """
+    seen = set() if seen is None else seen
+    for line in lines:
+        if line not in seen:
+            seen.add(line)
+            yield line
+
+
+def append_to_file(lines: Iterable[str], path: Path) -> Iterator[str]:
+    """
+    Append each line to the file (which is created if needed) as soon as it comes and then yield it.
+    """
+    with open(path, "a", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+            f.flush()
+            yield line
+
+
+def iter_annotated_concordances(corpus_manager: str, corpus_name: str, target: str, variants: list[str], query: str,
+                                number_of_concordances_to_fetch: int, is_target_valid: bool,
+                                is_target_regexp: bool, variants_weights: list[float] = None,
+                                construct_target_variant: Callable[[str, str], str] = None,
+                                use_cache: bool = True, workers: int = 1, print_lines: bool = True,
+                                output_path: Path = None, deduplicate: bool = True,
+                                index: DedupIndex = None, near_duplicate_threshold: float = None) -> Iterator[str]:
+    """
+    Fetch, annotate, deduplicate and write the concordances as a stream.
+
+    Args:
+        output_path: file to append the annotated concordances to; None means they are only yielded
+        deduplicate: whether to leave out the concordances which were yielded before and, with output_path,
+            those whose sentences are already in any data file (these are left out before annotating them)
+        index: the dedup index used with output_path. Defaults to DedupIndex(), or to
+            NearDuplicateIndex(threshold=near_duplicate_threshold) if the threshold is given.
+        near_duplicate_threshold: if given, also the near duplicates (see utils/near_duplicates.py) with at least
+            this similarity are left out: of the data files with output_path, otherwise of the yielded concordances
+        the others: see generate_concordances
+
+    Yields:
+        Annotated concordances, each one after it has been written.
+    """
+    plan = create_annotation_plan(target, variants, is_target_valid, is_target_regexp, variants_weights,
+                                  construct_target_variant)
+    counts = {"fetched": 0, "annotated": 0, "written": 0}
+
+    def count(items: Iterable[str], key: str) -> Iterator[str]:
+        for item in items:
+            counts[key] += 1
+            yield item
+
+    use_index = deduplicate and output_path is not None
+    own_index = use_index and index is None
+    if own_index:
+        index = DedupIndex() if near_duplicate_threshold is None \
+            else NearDuplicateIndex(threshold=near_duplicate_threshold)
+    if use_index:
+        index.sync()     # before the workers get the index, they only read it
+
+    fetched = prefetch(iter_fetched_concordances(corpus_manager, corpus_name, query, number_of_concordances_to_fetch,
+                                                 use_cache))
+    lines = _annotate_in_chunks(plan, count(fetched, "fetched"), workers, print_lines=print_lines,
+                                index=index if use_index else None)
+    lines = count(lines, "annotated")
+    if use_index:
+        lines = index.filter_new(lines, output_path)
+    elif near_duplicate_threshold is not None:
+        lines = iter_without_near_duplicates(lines, near_duplicate_threshold)
+    elif deduplicate:
+        lines = iter_unique(lines)
+    if output_path is not None:
+        lines = append_to_file(lines, output_path)
+
+    try:
+        yield from count(lines, "written")
+    finally:
+        if use_index:
+            index.refresh_file(output_path)
+        if own_index:
+            index.close()
+    _print_summary(counts["fetched"], counts["annotated"], use_index)
+    if (deduplicate or near_duplicate_threshold is not None) and counts["written"] < counts["annotated"]:
+        print(f"Left out {counts['annotated'] - counts['written']} duplicates.")
+
+
+def run_pipeline(filename: str, corpus_manager: str, corpus_name: str, target: str, variants: list[str], query: str,
+                 number_of_concordances_to_fetch: int, is_target_valid: bool, is_target_regexp: bool,
+                 variants_weights: list[float] = None, construct_target_variant: Callable[[str, str], str] = None,
+                 use_cache: bool = True, workers: int = 1, print_lines: bool = True,
+                 near_duplicate_threshold: float = None) -> int:
+    """
+    Run the whole pipeline and append the new annotated concordances to the data file in FILES_DIR,
+    like save_concordances_to_file does, but line by line.
+
+    Args:
+        filename: Only the unique name, the prefix DATA_CATEGORY and the filename extension will be added.
+        near_duplicate_threshold: if given, also the near duplicates of the sentences in the data files are left out
+        the others: see generate_concordances
+
+    Returns:
+        The number of written concordances.
+    """
+    output_path = settings.FILES_DIR / f"{settings.DATA_CATEGORY}_{filename}.txt"
+    number_of_written = 0
+    for _ in iter_annotated_concordances(corpus_manager, corpus_name, target, variants, query,
+                                         number_of_concordances_to_fetch, is_target_valid, is_target_regexp,
+                                         variants_weights, construct_target_variant, use_cache, workers, print_lines,
+                                         output_path, near_duplicate_threshold=near_duplicate_threshold):
+        number_of_written += 1
+    if output_path.exists():
+        txt_stats(output_path)
+    print(f"Successfully wrote {number_of_written} concordances to {output_path}.")
+    return number_of_written
@@ -0,0 +1,226 @@
+"""
+Batch runner of annotation jobs described in a JSON or TOML file, instead of editing and running main.py
+once per query:
+    python -m opravidlo_annotations.jobs jobs.toml
+
+Every job generates the concordances (generate_concordances), appends them to its data file
+(save_concordances_to_file) and logs the query into its query log (log_the_query), like main.py does.
+The jobs run concurrently, at most settings.JOB_CONCURRENCY[backend] of them against one backend ("combo" jobs
+use Kontext); the requests themselves are limited by the rate limiters of the API modules.
+
+The finished jobs are recorded in a state file (<spec>.state.json by default). When the runner is started again
+after an interruption or a failure, the finished jobs are skipped, unless their specification has changed
+or --restart is given.
+
+Example of the specification (TOML; JSON has the same structure):
+    [defaults]                      # optional, values used for the keys missing in the jobs
+    corpus_manager = "kontext"
+    corpus_name = "syn2015"
+    number_of_concordances_to_fetch = 80
+
+    [[jobs]]
+    name = "nevybi"                 # optional, unique; defaults to "<filename>_<index>"
+    query = '[lemma="vybít" & lc="nevybi.*" & tag=".*mA.*"]'
+    target = "nevybi"
+    variants = ["nevyby"]
+    variants_weights = [1]          # optional
+    is_target_valid = true
+    is_target_code = true           # optional, default false; construct_target_variant_from_code is used if true
+    number_of_concordances_to_log = 10  # optional, defaults to the number of saved concordances
+    filename = "vybít_vybýt"        # the data file is FILES_DIR / "<DATA_CATEGORY>_<filename>.txt"
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.core.concordance2annotation import construct_target_variant_from_code
+from opravidlo_annotations.core.generate_concordances import generate_concordances
+from opravidlo_annotations.utils.file_lock import file_lock
+from opravidlo_annotations.utils.query_logs import log_the_query
+from opravidlo_annotations.utils.utils import save_concordances_to_file
+
+REQUIRED_KEYS = ["corpus_manager", "query", "target", "variants", "is_target_valid",
+                 "number_of_concordances_to_fetch", "filename"]
+OPTIONAL_KEYS = {"name": None, "corpus_name": "", "variants_weights": None, "is_target_code": False,
+                 "number_of_concordances_to_log": None}
+BACKENDS = {"kontext": "kontext", "combo": "kontext", "sketch": "sketch"}
+
+
+def load_jobs(spec_path: Path) -> list[dict]:
+    """
+    Read and validate the job specification.
+
+    Returns: The jobs with the defaults filled in; every job has a unique "name".
+
+    Raises:
+        ValueError: If the specification is not valid.
+    """
+    spec_path = Path(spec_path)
+    if spec_path.suffix == ".toml":
+        import tomllib     # Python 3.11+
+
+        with open(spec_path, "rb") as f:
+            spec = tomllib.load(f)
+    else:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+
+    defaults = {**OPTIONAL_KEYS, **spec.get("defaults", {})}
+    jobs = []
+    for index, job_spec in enumerate(spec.get("jobs", [])):
+        job = {**defaults, **job_spec}
+        missing = [key for key in REQUIRED_KEYS if key not in job]
+        if missing:
+            raise ValueError(f"Job {index} in '{spec_path}' misses the keys: {missing}.")
+        unknown = set(job) - set(REQUIRED_KEYS) - set(OPTIONAL_KEYS)
+        if unknown:
+            raise ValueError(f"Job {index} in '{spec_path}' has unknown keys: {sorted(unknown)}.")
+        if job["corpus_manager"] not in BACKENDS:
+            raise ValueError(f"Unknown corpus manager in job {index}: {job['corpus_manager']}. "
+                             f"Choose either 'sketch', 'kontext', or 'combo'.")
+        if job["target"] in job["variants"]:
+            raise ValueError(f"Target and variant are equal in job {index}, correct it.")
+        if job["name"] is None:
+            job["name"] = f"{job['filename']}_{index}"
+        jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    duplicate_names = sorted({name for name in names if names.count(name) > 1})
+    if duplicate_names:
+        raise ValueError(f"Job names must be unique, repeated: {duplicate_names}.")
+    return jobs
+
+
+def job_hash(job: dict) -> str:
+    """
+    Returns: Hash of the job specification; a finished job is run again if its specification changes.
+    """
+    return hashlib.sha256(json.dumps(job, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class JobState:
+    """
+    Persistent record of the finished and failed jobs, shared by the threads of the runner.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f)
+        except FileNotFoundError:
+            self.jobs = {}
+
+    def is_done(self, job: dict) -> bool:
+        entry = self.jobs.get(job["name"], {})
+        return entry.get("status") == "done" and entry.get("hash") == job_hash(job)
+
+    def record(self, job: dict, status: str, **details) -> None:
+        """
+        Record the status of the job and save the state file (atomically, so an interruption does not corrupt it).
+        """
+        with self._lock:
+            self.jobs[job["name"]] = {"status": status, "hash": job_hash(job),
+                                      "time": datetime.now().isoformat(timespec="seconds"), **details}
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.jobs, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.path)
+
+
+def run_job(job: dict) -> int:
+    """
+    Generate, save and log the concordances of one job.
+
+    Returns: The number of saved concordances; those already in the data files are not saved again.
+    """
+    concordances = generate_concordances(job["corpus_manager"], job["corpus_name"], job["target"], job["variants"],
+                                         job["query"], job["number_of_concordances_to_fetch"],
+                                         job["is_target_valid"], job["is_target_code"], job["variants_weights"],
+                                         construct_target_variant_from_code if job["is_target_code"] else None,
+                                         print_lines=False)
+
+    # jobs with the same filename write into the same files, possibly at the same time
+    data_path = settings.FILES_DIR / f"{settings.DATA_CATEGORY}_{job['filename']}.txt"
+    with file_lock(data_path):
+        number_of_saved = save_concordances_to_file(job["filename"], concordances)
+        number_of_concordances_to_log = job["number_of_concordances_to_log"]
+        if number_of_concordances_to_log is None:
+            number_of_concordances_to_log = number_of_saved
+        log_the_query(job["filename"], job["corpus_name"] if job["corpus_manager"] != "combo" else "combo",
+                      job["query"], number_of_concordances_to_log, job["target"], job["variants"],
+                      job["is_target_valid"])
+    return number_of_saved
+
+
+def run_jobs(spec_path: Path, state_path: Path = None, restart: bool = False) -> dict[str, str]:
+    """
+    Run all jobs of the specification which are not finished yet, see the module docstring.
+
+    Args:
+        spec_path: JSON or TOML file with the jobs
+        state_path: file recording the finished jobs. Defaults to <spec_path without suffix>.state.json.
+        restart: run also the jobs which are already finished
+
+    Returns:
+        The status of every job: "done", "skipped" or "failed".
+    """
+    jobs = load_jobs(spec_path)
+    settings.FILES_DIR.mkdir(parents=True, exist_ok=True)
+    state = JobState(state_path if state_path is not None else Path(spec_path).with_suffix(".state.json"))
+    semaphores = {backend: threading.Semaphore(limit) for backend, limit in settings.JOB_CONCURRENCY.items()}
+    statuses = {}
+    progress_lock = threading.Lock()
+    number_of_finished = 0
+
+    def report(job: dict, message: str) -> None:
+        nonlocal number_of_finished
+        with progress_lock:
+            number_of_finished += 1
+            print(f"[{number_of_finished}/{len(jobs)}] {job['name']}: {message}")
+
+    def execute(job: dict) -> None:
+        with semaphores[BACKENDS[job["corpus_manager"]]]:
+            print(f"Started {job['name']} ({job['corpus_manager']}, {job['corpus_name'] or 'combo'}).")
+            start = time.perf_counter()
+            try:
+                number_of_concordances = run_job(job)
+            except Exception as e:     # one failed job does not stop the others, it is run again on resume
+                state.record(job, "failed", error=repr(e))
+                statuses[job["name"]] = "failed"
+                report(job, f"failed: {e!r}")
+                return
+            duration = time.perf_counter() - start
+            state.record(job, "done", concordances=number_of_concordances, seconds=round(duration, 1))
+            statuses[job["name"]] = "done"
+            report(job, f"saved {number_of_concordances} concordances in {duration:.1f} s")
+
+    with ThreadPoolExecutor(max_workers=sum(settings.JOB_CONCURRENCY.values())) as executor:
+        for job in jobs:
+            if state.is_done(job) and not restart:
+                statuses[job["name"]] = "skipped"
+                report(job, "already done, skipped")
+                continue
+            executor.submit(execute, job)
+
+    failed = [name for name, status in statuses.items() if status == "failed"]
+    print(f"Finished {len(jobs) - len(failed)} of {len(jobs)} jobs." +
+          (f" Failed: {', '.join(failed)}; run the same command again to retry them." if failed else ""))
+    return statuses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the annotation jobs from a JSON or TOML specification.")
+    parser.add_argument("spec", type=Path, help="JSON or TOML file with the jobs")
+    parser.add_argument("--state", type=Path, default=None, help="file recording the finished jobs")
+    parser.add_argument("--restart", action="store_true", help="run also the jobs which are already finished")
+    arguments = parser.parse_args()
+    run_jobs(arguments.spec, arguments.state, arguments.restart)
@@ -1,11 +1,11 @@
 import os
-import subprocess
 
 from opravidlo_annotations.core.concordance2annotation import construct_target_variant_from_code
 from opravidlo_annotations.core.generate_concordances import generate_concordances
-from opravidlo_annotations.settings import FILES_DIR, DATA_CATEGORY
+from opravidlo_annotations.settings import FILES_DIR, DATA_CATEGORY, OPEN_OUTPUT_IN_VIEWER
 from opravidlo_annotations.utils.utils import save_concordances_to_file, check, save_concordances_to_word
 from opravidlo_annotations.utils.query_logs import log_the_query, generate_text_readme
+from opravidlo_annotations.utils.writers import open_in_viewer
 
 
 if __name__ == "__main__":
@@ -27,7 +27,7 @@ if __name__ == "__main__":
     # 'number_of_concordances_to_fetch' says how many concordances to download. However, it is often more than we want to store as some will be deleted.
     # 'number_of_concordances_to_log' is then the number to appear in the log, it is the final desired number of concordances which will be stored.
     if corpus_manager == "sketch":
-        number_of_concordances_to_fetch = 400
+        number_of_concordances_to_fetch = 100
     elif corpus_manager == "kontext":
         number_of_concordances_to_fetch = 80
     number_of_concordances_to_log = 10
@@ -41,7 +41,8 @@ if __name__ == "__main__":
         file_path = FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"
         with open(file_path, "w") as file:
             file.write("")
-        subprocess.Popen(["notepad.exe", file_path])
+        if OPEN_OUTPUT_IN_VIEWER:
+            open_in_viewer(file_path)
 
     concordances = generate_concordances(corpus_manager, corpus_name, target, variants,
                                          query, number_of_concordances_to_fetch, is_target_valid,
@@ -0,0 +1,217 @@
+"""
+Report over the whole files/ tree (settings.FILES_ROOT_DIR): all category directories, their data files
+(data_*.txt) and query logs (README_*.json with the not yet compacted README_*.jsonl and README_*.*.compacting):
+    python -m opravidlo_annotations.report
+    python -m opravidlo_annotations.report --root path/to/files --workers 8
+
+The files are scanned in parallel by a process pool; the data files are read through mmap in windows of
+settings.REPORT_WINDOW_SIZE bytes, so even gigabytes of annotations need only a little memory. The counters
+of the files are merged into one summary, printed and saved as report.txt and report.json into the root.
+
+For every category directory, the report gives the number of data files, lines and annotated lines, the balance
+of the valid forms in the data files and in the query logs (the numbers check() compares for one file),
+and the corpus mix of the logged queries.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.utils.query_logs import read_logged_queries
+
+# the first annotation on a line (the rest of the line is consumed), as count_correct_variants_in_txt counts them
+_annotation_pattern = re.compile(rb"(\[\*[^\n]*?\*\])[^\n]*")
+
+
+def find_files(root: Path) -> tuple[list[Path], list[Path]]:
+    """
+    Returns: The data files and the JSON readmes under root, sorted. A readme is listed (as README_<filename>.json)
+    also if only its query log or a log of an interrupted compaction exists, i.e. before the first compaction.
+    """
+    data_files = sorted(path for path in root.rglob("data_*.txt") if path.is_file())
+    readmes = {path for path in root.rglob("README_*.json") if path.is_file()}
+    readmes.update(path.with_suffix(".json") for path in root.rglob("README_*.jsonl") if path.is_file())
+    readmes.update(path.with_name(path.name.rsplit(".", 2)[0] + ".json")
+                   for path in root.rglob("README_*.*.compacting") if path.is_file())
+    return data_files, sorted(readmes)
+
+
+def scan_data_file(path: Path, window_size: int = None) -> dict:
+    """
+    Count the lines and the annotations (the first one on every line) of a data file.
+
+    Returns: {"bytes", "lines", "annotated", "annotations": {annotation in lowercase: count}}
+    """
+    window_size = settings.REPORT_WINDOW_SIZE if window_size is None else window_size
+    size = os.path.getsize(path)
+    annotations = Counter()
+    number_of_lines = 0
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", min(start + window_size, size) - 1)    # the windows end with whole lines
+                end = size if end == -1 else end + 1
+                annotations.update(_annotation_pattern.findall(mm, start, end))
+                number_of_lines += mm[start:end].count(b"\n")
+                start = end
+            if mm[size - 1:size] != b"\n":
+                number_of_lines += 1
+
+    merged = Counter()      # unify all to lowercase
+    for annotation, count in annotations.items():
+        merged[annotation.decode("utf-8", errors="replace").lower()] += count
+    return {"bytes": size, "lines": number_of_lines, "annotated": sum(merged.values()),
+            "annotations": dict(merged)}
+
+
+def scan_query_log(path: Path) -> dict:
+    """
+    Count the logged queries of a JSON readme (which may not exist yet) and of its query logs which are not
+    compacted into it, see read_logged_queries.
+
+    Returns: {"queries", "concordances", "correct": {form: concordances}, "corpora": {corpus: concordances}}
+    """
+    queries = read_logged_queries(path)
+    correct, corpora = Counter(), Counter()
+    for query in queries:
+        number_of_concordances = query.get("number_of_concordances", 0)
+        if query.get("correct"):
+            correct[query["correct"][0]] += number_of_concordances
+        corpora[query.get("corpus_name") or query.get("corpora_name") or "N/A"] += number_of_concordances
+    return {"queries": len(queries), "concordances": sum(corpora.values()), "correct": dict(correct),
+            "corpora": dict(corpora)}
+
+
+def _valid_form(annotation: str) -> str:
+    """
+    Returns: The valid form of an annotation [*error|valid|corpus*].
+    """
+    parts = annotation[2:-2].split("|")
+    return parts[1] if len(parts) > 1 else annotation
+
+
+def build_report(root: Path = None, workers: int = None) -> dict:
+    """
+    Scan all files under root (defaults to settings.FILES_ROOT_DIR) in workers processes
+    (defaults to settings.REPORT_WORKERS, None means the number of CPUs) and merge their counters.
+
+    Returns: The report, see the module docstring; it is JSON serialisable.
+    """
+    root = Path(settings.FILES_ROOT_DIR if root is None else root)
+    workers = settings.REPORT_WORKERS if workers is None else workers
+    start = time.perf_counter()
+    data_files, readmes = find_files(root)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunk_size = max(1, len(data_files) // (4 * (workers or os.cpu_count() or 1)))
+        data_results = list(executor.map(scan_data_file, data_files, chunksize=chunk_size))
+        log_results = list(executor.map(scan_query_log, readmes, chunksize=chunk_size))
+
+    categories = {}
+
+    def category(path: Path) -> dict:
+        name = path.parent.relative_to(root).as_posix()
+        return categories.setdefault(name, {
+            "data_files": 0, "bytes": 0, "lines": 0, "annotated": 0, "valid_forms": Counter(),
+            "query_logs": 0, "queries": 0, "logged_concordances": 0, "logged_correct": Counter(),
+            "corpora": Counter(), "files": {}})
+
+    for path, result in zip(data_files, data_results):
+        entry = category(path)
+        entry["data_files"] += 1
+        for key in ("bytes", "lines", "annotated"):
+            entry[key] += result[key]
+        for annotation, count in result["annotations"].items():
+            entry["valid_forms"][_valid_form(annotation)] += count
+        entry["files"][path.name] = result
+    for path, result in zip(readmes, log_results):
+        entry = category(path)
+        entry["query_logs"] += 1
+        entry["queries"] += result["queries"]
+        entry["logged_concordances"] += result["concordances"]
+        entry["logged_correct"].update(result["correct"])
+        entry["corpora"].update(result["corpora"])
+        entry["files"][path.name] = result
+
+    totals = {key: sum(entry[key] for entry in categories.values())
+              for key in ("data_files", "bytes", "lines", "annotated", "query_logs", "queries", "logged_concordances")}
+    totals["corpora"] = sum((entry["corpora"] for entry in categories.values()), Counter())
+    return {"root": str(root), "seconds": round(time.perf_counter() - start, 2), "totals": totals,
+            "categories": dict(sorted(categories.items()))}
+
+
+def _table(headers: list[str], rows: list[list]) -> list[str]:
+    """
+    Returns: Lines of a table with the columns padded to the longest item (like generate_query_summary).
+    """
+    rows = [[str(item) for item in row] for row in rows]
+    col_widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+    lines = ["| " + " | ".join(h.ljust(col_widths[i]) for i, h in enumerate(headers)) + " |",
+             "|-" + "-|-".join("-" * width for width in col_widths) + "-|"]
+    lines += ["| " + " | ".join(row[i].ljust(col_widths[i]) for i in range(len(headers))) + " |" for row in rows]
+    return lines
+
+
+def format_report(report: dict) -> list[str]:
+    """
+    Returns: Lines of the text summary of the report.
+    """
+    totals = report["totals"]
+    lines = [f"Report of {report['root']}: {totals['data_files']} data files ({totals['bytes'] / 1e6:.1f} MB), "
+             f"{totals['query_logs']} query logs, scanned in {report['seconds']} s.", ""]
+
+    lines += _table(["Category", "Data files", "Lines", "Annotated", "Query logs", "Queries", "Logged concordances"],
+                    [[name, entry["data_files"], entry["lines"], entry["annotated"], entry["query_logs"],
+                      entry["queries"], entry["logged_concordances"]] for name, entry in report["categories"].items()]
+                    + [["total", totals["data_files"], totals["lines"], totals["annotated"], totals["query_logs"],
+                        totals["queries"], totals["logged_concordances"]]])
+
+    lines += ["", "Balance of the valid forms (annotated in the data files / logged in the queries):", ""]
+    rows = []
+    for name, entry in report["categories"].items():
+        for form in sorted(set(entry["valid_forms"]) | set(entry["logged_correct"])):
+            annotated, logged = entry["valid_forms"].get(form, 0), entry["logged_correct"].get(form, 0)
+            share = f"{annotated / entry['annotated']:.1%}" if entry["annotated"] else "N/A"
+            rows.append([name, form, annotated, share, logged, "" if annotated == logged else "differs"])
+    lines += _table(["Category", "Valid form", "Annotated", "Share", "Logged", ""], rows)
+
+    lines += ["", "Corpus mix of the logged queries:", ""]
+    corpora = totals["corpora"]
+    lines += _table(["Corpus", "Concordances", "Share"],
+                    [[corpus, count, f"{count / sum(corpora.values()):.1%}"] for corpus, count in corpora.most_common()])
+    return lines
+
+
+def write_report(report: dict, output_dir: Path = None) -> tuple[Path, Path]:
+    """
+    Save the report as report.txt and report.json into output_dir (defaults to the root of the report).
+
+    Returns: The paths of the text and the JSON file.
+    """
+    output_dir = Path(report["root"] if output_dir is None else output_dir)
+    txt_path, json_path = output_dir / "report.txt", output_dir / "report.json"
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.writelines(line + "\n" for line in format_report(report))
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    return txt_path, json_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report over all data files and query logs in the files/ tree.")
+    parser.add_argument("--root", type=Path, default=settings.FILES_ROOT_DIR)
+    parser.add_argument("--workers", type=int, default=settings.REPORT_WORKERS,
+                        help="the number of processes, defaults to the number of CPUs")
+    parser.add_argument("--output-dir", type=Path, default=None, help="defaults to the root")
+    arguments = parser.parse_args()
+    result = build_report(arguments.root, arguments.workers)
+    print("\n".join(format_report(result)))
+    paths = write_report(result, arguments.output_dir)
+    print(f"\nReport saved to {paths[0]} and {paths[1]}.")
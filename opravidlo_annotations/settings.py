@@ -12,3 +12,78 @@ SKETCH_ENGINE_USERNAME = os.getenv("SKETCH_ENGINE_USERNAME")
 OPRAVIDLO_DIR = Path(__file__).parent.parent  # \your\home\directory\opravidlo_annotations\
 FILES_DIR = OPRAVIDLO_DIR / "opravidlo_annotations" / "files" / "vyjm_slova" / "vybít_vybýt"
 DATA_CATEGORY = "data_vyjm_slova"
+
+# Kontext API limits, see https://github.com/czcorpus/kontext/wiki/API-Creating-a-concordance
+KONTEXT_REQUESTS_PER_SECOND = 12
+KONTEXT_REQUESTS_PER_DAY = 5000
+KONTEXT_QUOTA_LEDGER = OPRAVIDLO_DIR / "opravidlo_annotations" / "api" / "kontext_quota.json"
+KONTEXT_WAIT_ON_QUOTA = False   # True = wait until the next day when the daily quota is used up, False = raise an error
+KONTEXT_PAGE_SIZE = 50          # the number of concordances downloaded in one request
+
+# Sketch Engine fair use policy, see https://www.sketchengine.eu/fair-use-policy/
+SKETCH_REQUESTS_PER_SECOND = 100 / 60
+SKETCH_REQUESTS_PER_DAY = 2000
+SKETCH_QUOTA_LEDGER = OPRAVIDLO_DIR / "opravidlo_annotations" / "api" / "sketch_quota.json"
+SKETCH_WAIT_ON_QUOTA = False
+
+# On-disk cache of raw API responses, see api/cache.py
+RESPONSE_CACHE_DIR = OPRAVIDLO_DIR / "opravidlo_annotations" / "api" / "response_cache"
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60       # seconds
+RESPONSE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+STREAM_CHUNK_SIZE = 64 * 1024   # bytes of a response read and parsed at once
+
+# Waiting for asynchronously computed concordances, see api/polling.py
+POLL_INITIAL_DELAY = 0.5    # seconds
+POLL_MAX_DELAY = 8
+POLL_TIMEOUT = 120
+
+# Retries and circuit breaker for the HTTP calls, see api/resilience.py
+HTTP_TIMEOUTS = {               # (connect, read) timeouts in seconds
+    "kontext": (10, 60),
+    "sketch": (10, 120),
+}
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 1           # seconds
+HTTP_MAX_BACKOFF = 30
+HTTP_MAX_RETRY_AFTER = 120      # the longest wait requested by a Retry-After header which is respected
+CIRCUIT_FAILURE_THRESHOLD = 8   # consecutive failed calls after which the backend is not called for a while
+CIRCUIT_RESET_TIMEOUT = 60      # seconds
+
+# NLTK data (the Punkt sentence tokenizer models) downloaded by setup_nltk.py
+NLTK_DATA_DIR = OPRAVIDLO_DIR / "opravidlo_annotations" / "nltk_data"
+NLTK_RESOURCES = ["punkt_tab"]
+
+# Annotation and the streaming pipeline, see core/generate_concordances.py and core/pipeline.py
+ANNOTATION_CHUNK_SIZE = 100     # concordances annotated at once (and sent to a worker process at once)
+PIPELINE_BUFFER_SIZE = 500      # downloaded concordances waiting for the annotation
+
+# Batch jobs, see jobs.py
+JOB_CONCURRENCY = {             # the maximum number of jobs running at the same time against each backend
+    "kontext": 4,
+    "sketch": 2,
+}
+
+# Index of the sentences in all data files under FILES_DIR, see utils/dedup_index.py
+DEDUP_INDEX_PATH = FILES_DIR / "dedup_index.sqlite"
+
+# Near-duplicate detection, see utils/near_duplicates.py
+NEAR_DUPLICATE_INDEX_PATH = FILES_DIR / "near_duplicate_index.sqlite"
+NEAR_DUPLICATE_THRESHOLD = 0.7          # the minimum Jaccard similarity of the shingles of near duplicates
+NEAR_DUPLICATE_SHINGLE_SIZE = 5         # characters
+NEAR_DUPLICATE_BANDS = 16               # of the 64 MinHash values (a divisor of 64); more bands find more candidates
+NEAR_DUPLICATE_MAX_CANDIDATES = 100     # compared sentences per band
+
+# Statistics of the data files and the JSON readmes used by check(), see utils/stats_manifest.py
+STATS_MANIFEST_PATH = FILES_DIR / "stats_manifest.json"
+
+# Report over the whole files/ tree, see report.py
+FILES_ROOT_DIR = OPRAVIDLO_DIR / "opravidlo_annotations" / "files"
+REPORT_WORKERS = None           # processes scanning the files; None = the number of CPUs
+REPORT_WINDOW_SIZE = 64 * 2**20 # bytes of a data file scanned at once
+
+# Output writers (txt, jsonl, docx), see utils/writers.py
+WORD_OUTPUT_PATH = FILES_ROOT_DIR / "word.docx"
+OUTPUT_CHUNK_MAX_LINES = None   # lines in one output file before a new numbered one is started; None = no limit
+OUTPUT_CHUNK_MAX_BYTES = None   # bytes in one output file (uncompressed); None = no limit
+OPEN_OUTPUT_IN_VIEWER = False   # open the written file in the default application of the system
@@ -0,0 +1,47 @@
+"""
+One-time download of the NLTK data needed for the sentence extraction (the Punkt models) into settings.NLTK_DATA_DIR.
+Nothing is downloaded when the package is imported, so run this once after the installation:
+    python -m opravidlo_annotations.setup_nltk
+Running it again only checks that the data are present.
+"""
+import argparse
+from pathlib import Path
+
+from opravidlo_annotations import settings
+
+
+def is_nltk_data_installed(data_dir: Path = None) -> bool:
+    """
+    Returns: True if all settings.NLTK_RESOURCES are present in data_dir (defaults to settings.NLTK_DATA_DIR).
+    """
+    data_dir = settings.NLTK_DATA_DIR if data_dir is None else data_dir
+    return all((data_dir / "tokenizers" / resource).is_dir() for resource in settings.NLTK_RESOURCES)
+
+
+def download_nltk_data(data_dir: Path = None, force: bool = False) -> None:
+    """
+    Download settings.NLTK_RESOURCES into data_dir (defaults to settings.NLTK_DATA_DIR) unless they are there already.
+
+    Raises:
+        RuntimeError: If the download fails.
+    """
+    import nltk
+
+    data_dir = settings.NLTK_DATA_DIR if data_dir is None else data_dir
+    if is_nltk_data_installed(data_dir) and not force:
+        print(f"NLTK data are already installed in '{data_dir}'.")
+        return
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for resource in settings.NLTK_RESOURCES:
+        if not nltk.download(resource, download_dir=str(data_dir), quiet=True):
+            raise RuntimeError(f"Downloading the NLTK resource '{resource}' failed.")
+    print(f"NLTK data were installed into '{data_dir}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the NLTK data used by the project.")
+    parser.add_argument("--data-dir", type=Path, default=settings.NLTK_DATA_DIR)
+    parser.add_argument("--force", action="store_true", help="download the data even if they are present")
+    arguments = parser.parse_args()
+    download_nltk_data(arguments.data_dir, arguments.force)
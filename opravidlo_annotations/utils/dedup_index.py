@@ -0,0 +1,234 @@
+"""
+Persistent index of the sentences in all data files under FILES_DIR, used to find duplicates across the files.
+
+The index is an SQLite database mapping a hash of every sentence to the first file and line where it occurs.
+The sentences are compared without the annotation, so the same corpus sentence is found even if a different
+variant was chosen for it: "Stál před [*jejích|jejich|corpus*] chalupou." is stored under the hashes
+of both "Stál před jejích chalupou." and "Stál před jejich chalupou.".
+
+The files are indexed incrementally: of every file, only the lines appended since the last sync are read.
+If a file is changed in another way (detected by its size, modification time and a hash of the last indexed
+bytes), or removed, the index is built again.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+from opravidlo_annotations import settings
+
+_annotation_pattern = re.compile(r"\[\*([^|\]]*)\|([^|\]]*)\|corpus\*\]")
+_whitespace_pattern = re.compile(r"\s+")
+TAIL_SIZE = 4096    # the number of the last read bytes whose hash is compared to detect an edited file
+
+
+def _hash(sentence: str) -> bytes:
+    return hashlib.blake2b(_whitespace_pattern.sub(" ", sentence).strip().encode("utf-8"), digest_size=16).digest()
+
+
+def sentence_keys(line: str) -> set[bytes]:
+    """
+    Returns: Hashes of the line without the annotations: one with the first forms and one with the second forms,
+    or one hash if the line is not annotated.
+    """
+    return {_hash(_annotation_pattern.sub(rf"\g<{slot}>", line)) for slot in (1, 2)}
+
+
+def tail_hash(f: BinaryIO, offset: int) -> str:
+    """
+    Returns: Hash of the TAIL_SIZE bytes of the open file before the offset. If it is the same as when the file
+    was read up to the offset, the file was (most likely) only appended to since then.
+    """
+    start = max(0, offset - TAIL_SIZE)
+    f.seek(start)
+    return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+
+def is_data_file(path: Path) -> bool:
+    """
+    Returns: True for the text files with the annotated sentences (not the readme files).
+    """
+    return path.suffix == ".txt" and not path.name.startswith("README_")
+
+
+class DedupIndex:
+    """
+    Handle to the index. It can be shared by threads and passed to other processes (it opens its own connection
+    in each process).
+
+    Examples:
+        with DedupIndex() as index:
+            new_lines = list(index.filter_new(lines, path))
+    """
+    _schema = """
+        CREATE TABLE IF NOT EXISTS sentences (key BLOB PRIMARY KEY, path TEXT, line_number INTEGER) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, number_of_lines INTEGER,
+            tail_hash TEXT);
+    """
+    _tables = ("sentences", "files")
+
+    def __init__(self, db_path: Path = None, root: Path = None):
+        self.db_path = Path(settings.DEDUP_INDEX_PATH if db_path is None else db_path)
+        self.root = Path(settings.FILES_DIR if root is None else root)
+        self._lock = threading.RLock()
+        self._connection = None
+        self._synced = False
+
+    def __getstate__(self) -> dict:
+        return {"db_path": self.db_path, "root": self.root}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+        self._synced = True     # by the process which passed the index, this one only reads it
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.executescript(self._schema)
+        return self._connection
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def relative_path(self, path: Path) -> str:
+        """
+        Returns: The path relative to the root, as it is stored in the index.
+        """
+        path = Path(path)
+        return path.relative_to(self.root).as_posix() if path.is_relative_to(self.root) else str(path)
+
+    def _insert(self, line: str, path: str, line_number: int) -> bool:
+        """
+        Returns: False if the sentence was in the index already.
+        """
+        cursor = self.connection.executemany("INSERT OR IGNORE INTO sentences VALUES (?, ?, ?)",
+                                             [(key, path, line_number) for key in sentence_keys(line)])
+        return cursor.rowcount > 0
+
+    def _is_only_appended(self, path: Path) -> bool:
+        """
+        Returns: False if the file was indexed before and then changed other way than by appending
+        (it is not larger and it was modified, or the last indexed bytes are different).
+        """
+        stat = path.stat()
+        row = self.connection.execute("SELECT size, mtime, tail_hash FROM files WHERE path = ?",
+                                      (self.relative_path(path),)).fetchone()
+        if row is None or (row[0], row[1]) == (stat.st_size, stat.st_mtime):
+            return True
+        if row[0] >= stat.st_size:
+            return False
+        with open(path, "rb") as f:
+            return tail_hash(f, row[0]) == row[2]
+
+    def _index_file(self, path: Path) -> None:
+        """
+        Index the lines of the file appended since it was indexed last time (all of them if it is new).
+        """
+        relative_path = self.relative_path(path)
+        stat = path.stat()
+        row = self.connection.execute("SELECT size, mtime, number_of_lines FROM files WHERE path = ?",
+                                      (relative_path,)).fetchone()
+        if row is not None and (row[0], row[1]) == (stat.st_size, stat.st_mtime):
+            return
+        offset, line_number = (row[0], row[2]) if row is not None else (0, 0)
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw_line in f:
+                line_number += 1
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line.strip():
+                    self._insert(line, relative_path, line_number)
+            size = f.tell()     # not stat.st_size, the file may have grown meanwhile
+            self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                    (relative_path, size, stat.st_mtime, line_number, tail_hash(f, size)))
+
+    def sync(self) -> None:
+        """
+        Bring the index up to date with the data files under the root directory. If a file was removed or changed
+        other way than by appending (e.g. by remove_duplicates), the whole index is built again, because the
+        sentences of the other files which duplicate its old lines are not in the index.
+        """
+        with self._lock, self.connection:
+            paths = sorted(path for path in self.root.rglob("*.txt") if is_data_file(path)) \
+                if self.root.exists() else []
+            indexed_paths = {row[0] for row in self.connection.execute("SELECT path FROM files")}
+            if not indexed_paths <= {self.relative_path(path) for path in paths} \
+                    or not all(self._is_only_appended(path) for path in paths):
+                for table in self._tables:
+                    self.connection.execute(f"DELETE FROM {table}")
+            for path in paths:
+                self._index_file(path)
+            self._synced = True
+
+    def _ensure_synced(self) -> None:
+        if not self._synced:
+            self.sync()
+
+    def find(self, line: str) -> tuple[str, int] | None:
+        """
+        Returns: The file (relative to the root) and the line number where the sentence first occurs,
+        or None if it is not in the index.
+        """
+        self._ensure_synced()
+        with self._lock:
+            return self._find(line)
+
+    def _find(self, line: str) -> tuple[str, int] | None:
+        for key in sentence_keys(line):
+            row = self.connection.execute("SELECT path, line_number FROM sentences WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is not None:
+                return row[0], row[1]
+        return None
+
+    def contains(self, line: str) -> bool:
+        return self.find(line) is not None
+
+    def filter_new(self, lines: Iterable[str], path: Path) -> Iterator[str]:
+        """
+        Yield only the lines whose sentences are not in the index yet, and add them to the index as lines
+        of the file path. The caller is expected to append the yielded lines to that file.
+        """
+        self._ensure_synced()
+        relative_path = self.relative_path(path)
+        with self._lock:
+            row = self.connection.execute("SELECT number_of_lines FROM files WHERE path = ?",
+                                          (relative_path,)).fetchone()
+        line_number = row[0] if row is not None else 0
+        for line in lines:
+            if self.contains(line):
+                continue
+            line_number += 1
+            with self._lock, self.connection:
+                self._insert(line, relative_path, line_number)
+            yield line
+
+    def refresh_file(self, path: Path) -> None:
+        """
+        Record the current size of the file after the lines from filter_new were written into it,
+        so that they are not read again by the next sync.
+        """
+        path = Path(path)
+        if not path.exists():
+            return
+        with self._lock, self.connection:
+            if self._is_only_appended(path):
+                self._index_file(path)
+                return
+        self.sync()
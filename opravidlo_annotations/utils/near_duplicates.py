@@ -0,0 +1,190 @@
+"""
+Detection of near-duplicate sentences: sentences which differ only in punctuation, quotes, letter case
+or a few characters, like the same text reposted on several web pages.
+
+The sentences are compared by the Jaccard similarity of their character shingles (substrings of
+settings.NEAR_DUPLICATE_SHINGLE_SIZE characters, after removing the annotation, the punctuation and the case).
+Every sentence gets a MinHash signature of 64 values (one-permutation hashing: each shingle is hashed once
+by CRC-32, whose top 6 bits choose one of 64 bins) and the signature is split into settings.NEAR_DUPLICATE_BANDS bands. Sentences sharing
+a whole band are the candidates (locality-sensitive hashing), and only the candidates are compared exactly,
+so looking up a sentence takes a few index lookups no matter how many sentences are stored.
+
+NearDuplicateIndex keeps the bands of the sentences in all data files in SQLite, the same way as DedupIndex
+(which it extends) keeps the exact ones, so it can be used wherever a DedupIndex is accepted:
+    save_concordances_to_file(filename, concordances, index=NearDuplicateIndex())
+    report_duplicates(filename, index=NearDuplicateIndex(threshold=0.6))
+"""
+import operator
+import re
+import struct
+import zlib
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from pathlib import Path
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.utils.dedup_index import DedupIndex, _annotation_pattern
+
+NUMBER_OF_BINS = 64
+_BIN_SHIFT = 26                     # the top 6 bits of a 32-bit hash choose one of the 64 bins
+_VALUE_MASK = (1 << _BIN_SHIFT) - 1
+_SIGNATURE_FORMAT = f"<{NUMBER_OF_BINS}I"
+_ESTIMATE_SLACK = 0.2   # the candidates whose signatures estimate the similarity lower are not compared exactly
+_non_word_pattern = re.compile(r"[\W_]+")
+
+
+def normalise_sentence(line: str) -> str:
+    """
+    Returns: The sentence in lowercase, without punctuation and with the annotation replaced by one of its forms
+    (the same one whichever variant was chosen).
+    """
+    line = _annotation_pattern.sub(lambda match: min(match.group(1), match.group(2)), line)
+    return _non_word_pattern.sub(" ", line.lower()).strip()
+
+
+def shingles(text: str, size: int = None) -> frozenset[str]:
+    """
+    Returns: All substrings of the text of the given length (defaults to settings.NEAR_DUPLICATE_SHINGLE_SIZE).
+    """
+    size = settings.NEAR_DUPLICATE_SHINGLE_SIZE if size is None else size
+    return frozenset(text[i:i + size] for i in range(max(1, len(text) - size + 1)))
+
+
+def minhash(shingle_set: Iterable[str]) -> list[int]:
+    """
+    Returns: The MinHash signature of the shingles: the minimum hash in each of the 64 bins (its lower 26 bits).
+    The empty bins take the value of the next non-empty bin, with the distance to it in the top 6 bits (rotation
+    densification), so that two signatures can be compared bin by bin.
+    """
+    # the minimum of a bin is the first of the sorted hashes which falls into it
+    hashes = sorted(map(zlib.crc32, map(str.encode, shingle_set)))
+    bins = []
+    for i in range(NUMBER_OF_BINS):
+        j = bisect_left(hashes, i << _BIN_SHIFT)
+        bins.append(hashes[j] & _VALUE_MASK if j < len(hashes) and hashes[j] >> _BIN_SHIFT == i else None)
+    if all(value is None for value in bins):
+        return [0] * NUMBER_OF_BINS
+
+    signature = list(bins)
+    for i in range(NUMBER_OF_BINS):
+        distance = 0
+        while signature[i] is None:
+            distance += 1
+            value = bins[(i + distance) % NUMBER_OF_BINS]
+            if value is not None:
+                signature[i] = value | (distance << _BIN_SHIFT)
+    return signature
+
+
+def band_keys(signature: list[int], bands: int = None) -> list[int]:
+    """
+    Returns: One key for each band of the signature: the number of the band and the CRC-32 of its values.
+    """
+    bands = settings.NEAR_DUPLICATE_BANDS if bands is None else bands
+    rows = NUMBER_OF_BINS // bands
+    packed = struct.pack(_SIGNATURE_FORMAT, *signature)
+    return [band << 32 | zlib.crc32(packed[band * rows * 4:(band + 1) * rows * 4]) for band in range(bands)]
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection) if a or b else 1.0
+
+
+@lru_cache(maxsize=4096)
+def _fingerprint(line: str, shingle_size: int, bands: int) -> tuple[str, frozenset[str], tuple[int, ...], list[int]]:
+    text = normalise_sentence(line)
+    shingle_set = shingles(text, shingle_size)
+    signature = minhash(shingle_set)
+    return text, shingle_set, tuple(signature), band_keys(signature, bands)
+
+
+class NearDuplicateIndex(DedupIndex):
+    """
+    DedupIndex which finds also the sentences similar to the given one. At most
+    settings.NEAR_DUPLICATE_MAX_CANDIDATES sentences are compared for each band, so even a band shared by a lot
+    of boilerplate does not make the lookup slow.
+
+    The threshold can be changed for every instance. After changing settings.NEAR_DUPLICATE_SHINGLE_SIZE or
+    settings.NEAR_DUPLICATE_BANDS, delete the index file (settings.NEAR_DUPLICATE_INDEX_PATH) to build it again.
+    """
+    _schema = DedupIndex._schema + """
+        CREATE TABLE IF NOT EXISTS near_sentences (id INTEGER PRIMARY KEY, path TEXT, line_number INTEGER, text TEXT,
+            signature BLOB);
+        CREATE TABLE IF NOT EXISTS near_bands (key INTEGER, id INTEGER, PRIMARY KEY (key, id)) WITHOUT ROWID;
+    """
+    _tables = DedupIndex._tables + ("near_sentences", "near_bands")
+
+    def __init__(self, db_path: Path = None, root: Path = None, threshold: float = None):
+        """
+        Args:
+            db_path: the SQLite file; defaults to settings.NEAR_DUPLICATE_INDEX_PATH, ":memory:" keeps it in memory
+            root: the directory with the data files; defaults to settings.FILES_DIR
+            threshold: the minimum Jaccard similarity of near duplicates; defaults to settings.NEAR_DUPLICATE_THRESHOLD
+        """
+        super().__init__(settings.NEAR_DUPLICATE_INDEX_PATH if db_path is None else db_path, root)
+        self.threshold = settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+        if not 0 < self.threshold <= 1:
+            raise ValueError(f"The threshold must be in (0, 1], got {self.threshold}.")
+
+    def __getstate__(self) -> dict:
+        return {**super().__getstate__(), "threshold": self.threshold}
+
+    def _fingerprint(self, line: str) -> tuple[str, frozenset[str], tuple[int, ...], list[int]]:
+        return _fingerprint(line, settings.NEAR_DUPLICATE_SHINGLE_SIZE, settings.NEAR_DUPLICATE_BANDS)
+
+    def _find(self, line: str) -> tuple[str, int] | None:
+        """
+        Returns: The first stored sentence (file and line number) whose similarity to the line is at least
+        the threshold, or None. The exact duplicates are found as well.
+        """
+        _, shingle_set, signature, keys = self._fingerprint(line)
+        candidates = set()
+        for key in keys:
+            candidates.update(row[0] for row in self.connection.execute(
+                "SELECT id FROM near_bands WHERE key = ? LIMIT ?", (key, settings.NEAR_DUPLICATE_MAX_CANDIDATES)))
+        if not candidates:
+            return None
+
+        # in the order in which they were stored; the signatures rule out most of the candidates cheaply
+        minimum_matches = (self.threshold - _ESTIMATE_SLACK) * NUMBER_OF_BINS
+        rows = self.connection.execute(f"SELECT path, line_number, text, signature FROM near_sentences "
+                                       f"WHERE id IN ({', '.join('?' * len(candidates))}) ORDER BY id",
+                                       tuple(candidates))
+        for path, line_number, text, candidate_signature in rows:
+            if sum(map(operator.eq, signature, struct.unpack(_SIGNATURE_FORMAT, candidate_signature))) \
+                    < minimum_matches:
+                continue
+            if jaccard(shingle_set, shingles(text, settings.NEAR_DUPLICATE_SHINGLE_SIZE)) >= self.threshold:
+                return path, line_number
+        return None
+
+    def _insert(self, line: str, path: str, line_number: int) -> bool:
+        if not super()._insert(line, path, line_number):
+            return False
+        text, _, signature, keys = self._fingerprint(line)
+        cursor = self.connection.execute("INSERT INTO near_sentences (path, line_number, text, signature) "
+                                         "VALUES (?, ?, ?, ?)",
+                                         (path, line_number, text, struct.pack(_SIGNATURE_FORMAT, *signature)))
+        self.connection.executemany("INSERT OR IGNORE INTO near_bands VALUES (?, ?)",
+                                    [(key, cursor.lastrowid) for key in keys])
+        return True
+
+
+def iter_without_near_duplicates(lines: Iterable[str], threshold: float = None) -> Iterator[str]:
+    """
+    Yield the lines which are not near duplicates of the previous ones (not of the data files), like iter_unique
+    does for exact duplicates. The order remains unchanged and blank lines are always yielded.
+
+    Args:
+        lines: lines to check, e.g. a stream of annotated concordances
+        threshold: the minimum Jaccard similarity of near duplicates; defaults to settings.NEAR_DUPLICATE_THRESHOLD
+    """
+    with NearDuplicateIndex(":memory:", threshold=threshold) as index:
+        index._synced = True    # there are no files to index, only the lines
+        for line_number, line in enumerate(lines, start=1):
+            if line.strip() and index.contains(line):   # we don't want to remove blank lines
+                continue
+            index._insert(line, "", line_number)
+            yield line
@@ -1,26 +1,27 @@
+"""
+Query logs: every logged query is appended as one JSON line to README_<filename>.jsonl, which takes the same
+time however long the history is, and concurrent runs do not overwrite each other's queries (the appends are
+guarded by file_lock). compact_query_log merges the logged queries into the JSON readme README_<filename>.json
+({"queries": [...], "comments": [...]}), which is read by generate_query_summary and generate_text_readme.
+"""
+import glob
 import json
+import os
+import uuid
 from pathlib import Path
 
 from opravidlo_annotations.settings import FILES_DIR
+from opravidlo_annotations.utils.file_lock import file_lock
 
 
 def log_the_query(filename: str, corpus_name: str, query: str, number_of_concordances: int,
                   target: str, variants: list, is_target_valid: bool) -> None:
     """
-    Log the query into a JSON file. If the file does not exist, it will be created.
-    The queries with the same filename are appended to the same file.
+    Log the query into the JSONL query log (README_<filename>.jsonl). If the file does not exist, it will be created.
+    The queries with the same filename are appended to the same file; see compact_query_log for the JSON readme.
     Returns: Nothing.
     """
-    full_filename = FILES_DIR / f"README_{filename}.json"
-
-    if not full_filename.exists():
-        starter = {"queries": [], "comments": []}
-        with open(full_filename, "w", encoding="utf-8") as file:
-            json.dump(starter, file, ensure_ascii=False, indent=4)
-        print(f"File {full_filename} does not exist, creating a new one.")
-
-    with open(full_filename, "r", encoding="utf-8") as file:
-        data = json.load(file, strict=False)    # strict=False mutes some errors regarding the parsing of control chars = those like \n, ', \t...
+    log_path = FILES_DIR / f"README_{filename}.jsonl"
 
     looking_for = "correct" if is_target_valid else "error"
     if corpus_name == "combo":
@@ -39,10 +40,95 @@ def log_the_query(filename: str, corpus_name: str, query: str, number_of_concord
         entry["correct"] = variants
         entry["error"] = [target]
 
-    data["queries"].append(entry)
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with file_lock(log_path):
+        with open(log_path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+
+def compact_query_log(json_path: Path) -> dict:
+    """
+    Move the queries from the query log (the .jsonl file next to the JSON readme) into the JSON readme
+    and empty the query log. If the JSON readme does not exist, it will be created.
+
+    The compaction can be interrupted at any point and run again without losing or repeating queries:
+    the query log is first renamed to README_<filename>.<id>.compacting with a new unique id, then its queries
+    are added to the readme together with the id ("last_compaction"), and only then the renamed log is deleted.
+    A renamed log whose id is already in the readme was merged before the interruption and is only deleted.
+
+    Args:
+        json_path (Path): Path to the JSON readme (README_<filename>.json)
+
+    Returns: The data of the JSON readme.
+    """
+    json_path = FILES_DIR / json_path
+    log_path = json_path.with_suffix(".jsonl")
+
+    with file_lock(log_path):
+        if json_path.exists():
+            with open(json_path, "r", encoding="utf-8") as file:
+                data = json.load(file, strict=False)    # strict=False mutes some errors regarding the parsing of control chars = those like \n, ', \t...
+        else:
+            data = {"queries": [], "comments": []}
+            print(f"File {json_path} does not exist, creating a new one.")
+
+        if log_path.exists() and log_path.stat().st_size:
+            log_path.rename(json_path.with_name(f"{json_path.stem}.{uuid.uuid4().hex}.compacting"))
+        pending_paths = sorted(pending_query_logs(json_path), key=lambda path: path.stat().st_mtime)
+        if not pending_paths and json_path.exists():
+            return data
+
+        for pending_path in pending_paths:
+            compaction_id = pending_path.suffixes[-2][1:]
+            if data.get("last_compaction") != compaction_id:
+                with open(pending_path, "r", encoding="utf-8") as file:
+                    data["queries"].extend(json.loads(line) for line in file if line.strip())
+                data["last_compaction"] = compaction_id
+                _write_json_atomically(data, json_path)
+            pending_path.unlink()
+        if not json_path.exists():
+            _write_json_atomically(data, json_path)
+    return data
+
+
+def pending_query_logs(json_path: Path) -> list[Path]:
+    """
+    Returns: The query logs renamed by compact_query_log (README_<filename>.<id>.compacting) which are left
+    from an interrupted compaction of the JSON readme.
+    """
+    return list(json_path.parent.glob(f"{glob.escape(json_path.stem)}.*.compacting"))
 
-    with open(full_filename, "w", encoding="utf-8") as file:
+
+def read_logged_queries(json_path: Path) -> list[dict]:
+    """
+    Read all logged queries of the JSON readme without compacting them: the queries in the readme (if it exists),
+    in the renamed logs not merged yet by an interrupted compaction and in the query log.
+
+    Args:
+        json_path (Path): Path to the JSON readme (README_<filename>.json)
+
+    Returns: The queries.
+    """
+    json_path = FILES_DIR / json_path
+    data = {}
+    if json_path.exists():
+        with open(json_path, "r", encoding="utf-8") as file:
+            data = json.load(file, strict=False)
+    queries = data.get("queries", [])
+    log_paths = [path for path in pending_query_logs(json_path)
+                 if path.suffixes[-2][1:] != data.get("last_compaction")]   # that one is in the readme already
+    for log_path in log_paths + [json_path.with_suffix(".jsonl")]:
+        if log_path.exists():
+            with open(log_path, "r", encoding="utf-8") as file:
+                queries += [json.loads(line) for line in file if line.strip()]
+    return queries
+
+
+def _write_json_atomically(data: dict, json_path: Path) -> None:
+    tmp_path = json_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
         json.dump(data, file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, json_path)
 
 
 def generate_query_summary(data: dict) -> list:
@@ -115,9 +201,9 @@ def generate_text_readme(filename: Path) -> None:
         filename (Path): Path to JSON readme file
 
     Returns: None. It saves the generated text readme file into FILES_DIR.
+    The logged queries are compacted into the JSON readme first, see compact_query_log.
     """
-    with open(FILES_DIR / filename, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = compact_query_log(filename)
 
     comments = data["comments"]
     summary_lines = generate_query_summary(data)
@@ -0,0 +1,177 @@
+"""
+Manifest with the statistics of the data files and the JSON readmes, so that check() does not read them whole
+after every query.
+
+For every data file, the manifest (settings.STATS_MANIFEST_PATH) keeps how many bytes of it were read, the counts
+of the annotated variants in them and the duplicates found in them; when lines are appended, only the new tail is
+read. For every JSON readme and its query log, it keeps the counts of the correct variants; of the query log
+(which is appended to), only the new queries are read.
+
+A file edited other way than by appending is detected by its size, modification time and a hash of the last
+read bytes, and then its statistics are computed again from the whole file.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import BinaryIO
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.utils.dedup_index import DedupIndex, tail_hash
+from opravidlo_annotations.utils.file_lock import file_lock
+
+_variant_pattern = re.compile(r"\[\*.*?\*\]")
+
+
+def variant_key(line: str) -> str | None:
+    """
+    Returns: The first bracketed variant expression in the line (e.g. [*vybyla|vybila|corpus*]) in lowercase,
+    or None.
+    """
+    match = _variant_pattern.search(line)
+    return match.group().lower() if match else None
+
+
+def count_query_variants(queries: list[dict], counter: dict) -> None:
+    """
+    Add the number of concordances of every query to the count of its (first) correct variant in counter.
+    The queries without a correct variant are skipped.
+    """
+    for query in queries:
+        correct_list = query.get("correct", [])
+        if not correct_list:
+            continue  # skip if 'correct' is empty or missing
+        correct = correct_list[0]
+        counter[correct] = counter.get(correct, 0) + query.get("number_of_concordances", 0)
+
+
+def _load(manifest_path: Path) -> dict:
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"txt": {}, "json": {}}
+
+
+def _save(manifest: dict, manifest_path: Path) -> None:
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+
+def _is_only_appended(entry: dict, f: BinaryIO, size: int) -> bool:
+    return entry["offset"] <= size and tail_hash(f, entry["offset"]) == entry["tail_hash"]
+
+
+def txt_stats(path: Path, index: DedupIndex = None, manifest_path: Path = None) -> dict:
+    """
+    Bring the statistics of the data file up to date, reading only the lines appended since the last call
+    (or the whole file if it is new to the manifest or was edited).
+
+    Args:
+        path: the data file
+        index: the dedup index used to find the duplicates. Defaults to DedupIndex().
+        manifest_path: defaults to settings.STATS_MANIFEST_PATH
+
+    Returns:
+        The statistics: "counts" of the variant expressions (see count_correct_variants_in_txt), their "total",
+        the "number_of_lines" and the "duplicates" as [line number, file of the first occurrence, its line number].
+    """
+    path = Path(path)
+    manifest_path = Path(settings.STATS_MANIFEST_PATH if manifest_path is None else manifest_path)
+    with file_lock(manifest_path):
+        manifest = _load(manifest_path)
+        key = path.name
+        entry = manifest["txt"].get(key)
+        stat = path.stat()
+        if entry is not None and (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime):
+            return entry
+
+        own_index = index is None
+        index = DedupIndex() if own_index else index
+        try:
+            with open(path, "rb") as f:
+                if entry is None or not _is_only_appended(entry, f, stat.st_size):
+                    if entry is not None:
+                        print(f"File '{path.name}' was edited, computing its statistics again.")
+                    entry = {"offset": 0, "number_of_lines": 0, "counts": {}, "total": 0, "duplicates": []}
+                _read_tail(entry, f, path, index)
+                entry.update(size=stat.st_size, mtime=stat.st_mtime, tail_hash=tail_hash(f, entry["offset"]))
+        finally:
+            if own_index:
+                index.close()
+
+        manifest["txt"][key] = entry
+        _save(manifest, manifest_path)
+        return entry
+
+
+def _read_tail(entry: dict, f: BinaryIO, path: Path, index: DedupIndex) -> None:
+    """
+    Add the complete lines after entry["offset"] to the statistics in entry.
+    """
+    index.sync()
+    own_path = index.relative_path(path)
+    f.seek(entry["offset"])
+    for raw_line in f:
+        if not raw_line.endswith(b"\n"):
+            break   # the last line is being written, it is read next time
+        entry["offset"] += len(raw_line)
+        entry["number_of_lines"] += 1
+        line = raw_line.decode("utf-8")
+        key = variant_key(line)
+        if key is not None:
+            entry["counts"][key] = entry["counts"].get(key, 0) + 1
+            entry["total"] += 1
+        if line.strip():
+            first_occurrence = index.find(line)
+            if first_occurrence is not None and first_occurrence != (own_path, entry["number_of_lines"]):
+                entry["duplicates"].append([entry["number_of_lines"], *first_occurrence])
+
+
+def json_stats(path: Path, manifest_path: Path = None) -> dict:
+    """
+    Returns: The "counts" of the correct variants in the JSON readme and in its query log (the queries not compacted
+    into the readme yet, see utils/query_logs.py) and their "total", as count_correct_variants_in_json counts them.
+    The readme is parsed again only if it changed; of the query log, only the appended queries are read.
+    """
+    path = Path(path)
+    log_path = path.with_suffix(".jsonl")
+    manifest_path = Path(settings.STATS_MANIFEST_PATH if manifest_path is None else manifest_path)
+    with file_lock(manifest_path):
+        manifest = _load(manifest_path)
+        readme = manifest["json"].get(path.name, {"size": 0, "mtime": 0, "counts": {}})
+        if path.exists():
+            stat = path.stat()
+            if (readme["size"], readme["mtime"]) != (stat.st_size, stat.st_mtime):
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                readme = {"size": stat.st_size, "mtime": stat.st_mtime, "counts": {}}
+                count_query_variants(data.get("queries", []), readme["counts"])
+            manifest["json"][path.name] = readme
+
+        log = manifest.setdefault("jsonl", {}).get(log_path.name)
+        if log_path.exists():
+            stat = log_path.stat()
+            if log is None or (log["size"], log["mtime"]) != (stat.st_size, stat.st_mtime):
+                with open(log_path, "rb") as f:
+                    if log is None or not _is_only_appended(log, f, stat.st_size):
+                        log = {"offset": 0, "counts": {}}   # new, or emptied by the compaction
+                    f.seek(log["offset"])
+                    for raw_line in f:
+                        if not raw_line.endswith(b"\n"):
+                            break   # the last query is being written, it is read next time
+                        log["offset"] += len(raw_line)
+                        count_query_variants([json.loads(raw_line)], log["counts"])
+                    log.update(size=stat.st_size, mtime=stat.st_mtime, tail_hash=tail_hash(f, log["offset"]))
+            manifest["jsonl"][log_path.name] = log
+        else:
+            manifest["jsonl"].pop(log_path.name, None)
+            log = None
+        _save(manifest, manifest_path)
+
+        counts = dict(readme["counts"])
+        for variant, count in (log["counts"] if log is not None else {}).items():
+            counts[variant] = counts.get(variant, 0) + count
+        return {"counts": counts, "total": sum(counts.values())}
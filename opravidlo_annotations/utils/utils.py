@@ -1,12 +1,17 @@
-import os
 import json
-import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-import docx
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from opravidlo_annotations.settings import FILES_DIR, DATA_CATEGORY, WORD_OUTPUT_PATH
+from opravidlo_annotations.utils.dedup_index import DedupIndex, sentence_keys
+from opravidlo_annotations.utils.near_duplicates import NearDuplicateIndex
+from opravidlo_annotations.utils.stats_manifest import count_query_variants, json_stats, txt_stats, variant_key
+from opravidlo_annotations.utils.writers import write_concordances
 
-from opravidlo_annotations.settings import FILES_DIR, DATA_CATEGORY, OPRAVIDLO_DIR
+# python-docx is imported only in set_document_language, its import takes long
+if TYPE_CHECKING:
+    from docx.document import Document
 
 
 def print_json(data: dict, indent: int = 4) -> None:
@@ -20,13 +25,15 @@ def print_json(data: dict, indent: int = 4) -> None:
     print(json.dumps(data, ensure_ascii=False, indent=indent))
 
 
-def save_concordances_to_file(filename: str, concordances: list[str]) -> None:
+def save_concordances_to_file(filename: str, concordances: list[str], index: DedupIndex = None) -> int:
     """
     Write concordances to a file. If the file does not exist, it will be created.
+    The concordances whose sentences are already in some data file under FILES_DIR are left out.
     Args:
         filename: filename to write to. Only the unique name, the prefix "data_zajmena" and the filename extension will be added.
         concordances: lines to be written to the file
-    Returns: None
+        index: the dedup index to check the concordances against. Defaults to DedupIndex().
+    Returns: The number of the written concordances (without the left out ones).
     """
     full_filename = FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"
     do_append = True
@@ -34,20 +41,35 @@ def save_concordances_to_file(filename: str, concordances: list[str]) -> None:
         do_append = False
         print(f"File {full_filename} does not exist, creating a new one.")
 
-    with open(full_filename, "a" if do_append else "w", encoding="utf-8") as f:
-        for c in concordances:
-            f.write(c + "\n")
-
-    print(f"Succesfully wrote {len(concordances)} concordances to {full_filename}.")
-
-
-def set_document_language(document: docx.Document(), lang: str = "cs-CZ") -> None:
+    own_index = index is None
+    index = DedupIndex() if own_index else index
+    try:
+        new_concordances = list(index.filter_new(concordances, full_filename))
+        with open(full_filename, "a" if do_append else "w", encoding="utf-8") as f:
+            for c in new_concordances:
+                f.write(c + "\n")
+        index.refresh_file(full_filename)
+        txt_stats(full_filename, index)
+    finally:
+        if own_index:
+            index.close()
+
+    if len(new_concordances) < len(concordances):
+        print(f"Left out {len(concordances) - len(new_concordances)} concordances which are already in the data files.")
+    print(f"Succesfully wrote {len(new_concordances)} concordances to {full_filename}.")
+    return len(new_concordances)
+
+
+def set_document_language(document: "Document", lang: str = "cs-CZ") -> None:
     """Set the default language for all text in the document.
 
     Args:
         document: A python-docx Document object.
         lang: Language code (e.g., "cs-CZ" for Czech).
     """
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
     styles = document.styles
 
     style = styles["Normal"]
@@ -60,32 +82,24 @@ def set_document_language(document: docx.Document(), lang: str = "cs-CZ") -> Non
 
     lang_elem.set(qn("w:val"), lang)
 
-def save_concordances_to_word(concordances: list[str]) -> None:
+def save_concordances_to_word(concordances: Iterable[str], output_path: Path = None, max_lines: int = None,
+                              open_viewer: bool = None) -> list[Path]:
     """
-    Write concordances to the helper docx file.
+    Write concordances to the helper docx file, one paragraph each. The paragraphs are streamed into the file
+    (see utils/writers.py), so the concordances can be a generator of any length.
 
     Args:
         concordances: lines to be written to the file
+        output_path: defaults to settings.WORD_OUTPUT_PATH
+        max_lines: paragraphs in one file, the rest goes to numbered files word_002.docx, ...;
+            defaults to settings.OUTPUT_CHUNK_MAX_LINES
+        open_viewer: open the document in the default application; defaults to settings.OPEN_OUTPUT_IN_VIEWER
 
     Returns:
-        None
+        The paths of the written files.
     """
-    doc = docx.Document()
-    style = doc.styles["Normal"]
-    font = style.font
-    font.name = "Aptos"
-    font.size = docx.shared.Pt(11)
-
-    set_document_language(doc)
-
-    for c in concordances:
-        doc.add_paragraph(c)
-
-    output_path = OPRAVIDLO_DIR / "opravidlo_annotations" / "files" / "word.docx"
-    doc.save(output_path)
-    os.startfile(output_path)
-
-    print(f"Successfully wrote {len(concordances)} concordances to {output_path.name}.")
+    output_path = WORD_OUTPUT_PATH if output_path is None else output_path
+    return write_concordances(concordances, output_path, "docx", max_lines=max_lines, open_viewer=open_viewer)
 
 
 def count_correct_variants_in_json(filename: str) -> tuple[dict, int]:
@@ -107,15 +121,7 @@ def count_correct_variants_in_json(filename: str) -> tuple[dict, int]:
         data = json.load(file)
 
     counter = {}
-
-    for query in data.get("queries", []):
-        correct_list = query.get("correct", [])
-        if not correct_list:
-            continue  # skip if 'correct' is empty or missing
-
-        correct = correct_list[0]
-        count = query.get("number_of_concordances", 0)
-        counter[correct] = counter.get(correct, 0) + count
+    count_query_variants(data.get("queries", []), counter)
 
     total_number_of_records = sum(counter.values())
     return counter, total_number_of_records
@@ -140,9 +146,8 @@ def count_correct_variants_in_txt(filename: str) -> tuple[dict, int]:
 
     with open(filename, "r", encoding="utf-8") as file:
         for line in file:
-            match = re.search(r'\[\*.*?\*\]', line)
-            if match:
-                key = match.group().lower()     # unify all to lowercase
+            key = variant_key(line)     # unified to lowercase
+            if key is not None:
                 counter[key] = counter.get(key, 0) + 1
 
     total_number_of_records = sum(counter.values())
@@ -152,6 +157,8 @@ def count_correct_variants_in_txt(filename: str) -> tuple[dict, int]:
 def find_duplicates(strings: list[str]) -> tuple[list[str], list[str]]:
     """
     Find duplicates in a list of strings. The order remains unchanged.
+    The sentences are compared as in the dedup index (see utils/dedup_index.py): without the annotations
+    and with normalised whitespace, so the same sentence with another variant chosen is a duplicate as well.
     Args:
         strings (list[str]): List of strings to check.
 
@@ -159,28 +166,42 @@ def find_duplicates(strings: list[str]) -> tuple[list[str], list[str]]:
         tuple[list[str], list[str]]: List of strings without duplicates and list of duplicates
         found in the input list; both without repetitions.
     """
-    seen = []
+    seen = set()
+    without_duplicates = []
     duplicates = []
     for string in strings:
-        if string != "\n" and string in seen:   # we don't want to remove blank lines
+        if not string.strip():  # we don't want to remove blank lines
+            without_duplicates.append(string)
+            continue
+        keys = sentence_keys(string)
+        if not seen.isdisjoint(keys):
             duplicates.append(string)
         else:
-            seen.append(string)
-    return seen, duplicates
+            seen.update(keys)
+            without_duplicates.append(string)
+    return without_duplicates, duplicates
 
 
-def remove_duplicates(filename: str) -> None:
+def _remove_duplicates(file_path: Path) -> list[str]:
     """
-    Returns: None; it saves the data back to the file without duplicates and prints the duplicates.
+    Returns: The removed duplicates; the file is rewritten without them (and not touched if there are none,
+    so the indexes and the stats manifest stay valid).
     """
-    file_path = FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"
     with open(file_path, "r", encoding="utf-8") as f:
         lines = f.readlines()
     without_duplicates, duplicates = find_duplicates(lines)
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        [f.write(line) for line in without_duplicates]
+    if duplicates:
+        with open(file_path, "w", encoding="utf-8") as f:
+            [f.write(line) for line in without_duplicates]
+    return duplicates
+
 
+def remove_duplicates(filename: str) -> None:
+    """
+    Returns: None; it saves the data back to the file without duplicates and prints the duplicates.
+    """
+    duplicates = _remove_duplicates(FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt")
     if duplicates:
         print(f"Found {len(duplicates)} duplicates in '{filename}' file.")
         print([duplicate for duplicate in duplicates])
@@ -188,12 +209,71 @@ def remove_duplicates(filename: str) -> None:
         print("No duplicates found.")
 
 
-def check(filename: str) -> None:
+def report_duplicates(filename: str, index: DedupIndex = None) -> list[tuple[int, str, int]]:
     """
-    Remove duplicates and then check the proportion of variants and whether the queries
-    (and especially 'number of concordances' variable) are same in the JSON readme and in the real text.
+    Find the lines of the data file whose sentences occur earlier in the same file or in another data file
+    under FILES_DIR. The file is not changed; use remove_duplicates to remove the duplicates inside the file.
+    With a NearDuplicateIndex, the near duplicates are found as well.
+
+    Returns: The duplicates as (line number, file where the sentence first occurs, its line number there);
+    they are also printed.
     """
-    remove_duplicates(filename)
-    print("json: ", count_correct_variants_in_json(FILES_DIR / f"README_{filename}.json"))
-    print("txt: ", count_correct_variants_in_txt(FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"))
+    file_path = FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"
+    own_index = index is None
+    index = DedupIndex() if own_index else index
+    try:
+        index.sync()
+        own_path = index.relative_path(file_path)
+        duplicates = []
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                first_occurrence = index.find(line)
+                if first_occurrence is not None and first_occurrence != (own_path, line_number):
+                    duplicates.append((line_number, *first_occurrence))
+    finally:
+        if own_index:
+            index.close()
+
+    _print_duplicates(filename, duplicates)
+    return duplicates
+
+
+def _print_duplicates(filename: str, duplicates: list) -> None:
+    if duplicates:
+        print(f"Found {len(duplicates)} duplicates in '{filename}' file.")
+        for line_number, path, first_line_number in duplicates:
+            print(f"line {line_number}: first in '{path}' on line {first_line_number}")
+    else:
+        print("No duplicates found.")
+
+
+def check(filename: str, near_duplicate_threshold: float = None) -> None:
+    """
+    Remove duplicates inside the data file, report the duplicates across all data files (without rewriting
+    the other files) and then check the proportion of variants and whether the queries (and especially
+    'number of concordances' variable) are same in the JSON readme and in the real text.
+    The statistics are kept in the stats manifest (see utils/stats_manifest.py), so only the lines appended
+    since the last check are read; the whole file is read and rewritten only if the manifest found a sentence
+    repeated inside the file (compared without the annotations, as remove_duplicates compares them).
+    If near_duplicate_threshold is given, also the near duplicates with at least this similarity are reported
+    (see utils/near_duplicates.py); this reads the whole file.
+    """
+    data_path = FILES_DIR / f"{DATA_CATEGORY}_{filename}.txt"
+    txt = txt_stats(data_path)
+    removed = []
+    if any(path == data_path.name for _, path, _ in txt["duplicates"]):
+        removed = _remove_duplicates(data_path)
+        txt = txt_stats(data_path)     # the file was rewritten, so its statistics are computed again
+    if removed:
+        print(f"Removed {len(removed)} duplicates inside '{filename}' file.")
+    if near_duplicate_threshold is None:
+        _print_duplicates(filename, txt["duplicates"])
+    else:
+        with NearDuplicateIndex(threshold=near_duplicate_threshold) as index:
+            report_duplicates(filename, index)
+    readme = json_stats(FILES_DIR / f"README_{filename}.json")
+    print("json: ", (readme["counts"], readme["total"]))
+    print("txt: ", (txt["counts"], txt["total"]))
     print()
@@ -0,0 +1,299 @@
+"""
+Streaming writers of the concordances: plain text, JSON Lines and Word (DOCX).
+
+Every writer takes the lines one by one (write, or write_all with any iterable, e.g. the generator of
+run_pipeline), so the concordances never have to be held in memory together. With max_lines or max_bytes
+(defaults settings.OUTPUT_CHUNK_MAX_LINES and settings.OUTPUT_CHUNK_MAX_BYTES), the output rolls over into
+numbered chunks word_001.docx, word_002.docx, ... once a chunk is full; the written chunks are in writer.paths.
+
+The DOCX writer does not use python-docx, which builds the whole document in memory: it writes the few fixed
+parts of the package first and then streams the paragraphs straight into the compressed word/document.xml.
+The document has the same style as before (Aptos 11 pt, Czech language).
+
+Examples:
+    with DocxWriter(path, max_lines=5000) as writer:
+        writer.write_all(concordances)
+    write_concordances(concordances, FILES_DIR / "concordances.jsonl")
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import zipfile
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from opravidlo_annotations import settings
+
+# characters which are not allowed in XML 1.0 (python-docx refuses them as well)
+_invalid_xml_pattern = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+class ConcordanceWriter(ABC):
+    """
+    Base class of the writers. A subclass sets the suffix and implements _encode, _open, _write_line and _close.
+    The output file is always created, even if no line is written.
+    """
+    suffix = ""
+
+    def __init__(self, path: Path, max_lines: int = None, max_bytes: int = None):
+        """
+        Args:
+            path: the output file; with a limit, the chunks are named after it: <stem>_001<suffix>, ...
+            max_lines: the maximum number of lines in a chunk; defaults to settings.OUTPUT_CHUNK_MAX_LINES,
+                0 or None means no limit
+            max_bytes: the maximum (uncompressed) size of the lines in a chunk; defaults to
+                settings.OUTPUT_CHUNK_MAX_BYTES, 0 or None means no limit. A single longer line gets its own chunk.
+        """
+        self.path = Path(path)
+        self.max_lines = settings.OUTPUT_CHUNK_MAX_LINES if max_lines is None else max_lines
+        self.max_bytes = settings.OUTPUT_CHUNK_MAX_BYTES if max_bytes is None else max_bytes
+        self.paths = []
+        self.number_of_lines = 0
+        self._is_open = False
+        self._chunk_lines = 0
+        self._chunk_bytes = 0
+
+    def __enter__(self) -> "ConcordanceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _chunk_path(self) -> Path:
+        if not self.max_lines and not self.max_bytes:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}_{len(self.paths) + 1:03d}{self.path.suffix}")
+
+    def _is_full(self, size: int) -> bool:
+        return self._chunk_lines > 0 and (bool(self.max_lines) and self._chunk_lines >= self.max_lines
+                                          or bool(self.max_bytes) and self._chunk_bytes + size > self.max_bytes)
+
+    def write(self, line: str) -> None:
+        """
+        Write one line (without the newline), starting a new chunk if the current one is full.
+        """
+        data = self._encode(line.rstrip("\r\n"))
+        if self._is_open and self._is_full(len(data)):
+            self._close()
+            self._is_open = False
+        if not self._is_open:
+            self._open_chunk()
+        self._write_line(data)
+        self._chunk_lines += 1
+        self._chunk_bytes += len(data)
+        self.number_of_lines += 1
+
+    def write_all(self, lines: Iterable[str]) -> int:
+        """
+        Returns: The number of the written lines.
+        """
+        number_of_lines = self.number_of_lines
+        for line in lines:
+            self.write(line)
+        return self.number_of_lines - number_of_lines
+
+    def close(self) -> None:
+        if not self.paths:
+            self._open_chunk()  # no line was written, create an empty file anyway
+        if self._is_open:
+            self._close()
+            self._is_open = False
+
+    def _open_chunk(self) -> None:
+        path = self._chunk_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._open(path)
+        self.paths.append(path)
+        self._is_open = True
+        self._chunk_lines = self._chunk_bytes = 0
+
+    @abstractmethod
+    def _encode(self, line: str) -> bytes:
+        """
+        Returns: The line as it is written into the file.
+        """
+
+    @abstractmethod
+    def _open(self, path: Path) -> None:
+        pass
+
+    @abstractmethod
+    def _write_line(self, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def _close(self) -> None:
+        pass
+
+
+class TxtWriter(ConcordanceWriter):
+    """
+    One concordance per line, as in the data files.
+    """
+    suffix = ".txt"
+
+    def _encode(self, line: str) -> bytes:
+        return (line + "\n").encode("utf-8")
+
+    def _open(self, path: Path) -> None:
+        self._file = open(path, "wb")
+
+    def _write_line(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class JsonlWriter(TxtWriter):
+    """
+    One JSON object {"text": concordance} per line.
+    """
+    suffix = ".jsonl"
+
+    def _encode(self, line: str) -> bytes:
+        return (json.dumps({"text": line}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_R = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_DOCX_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{_R}">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/>'
+        '</Relationships>'),
+    "word/_rels/document.xml.rels": (
+        f'<Relationships xmlns="{_R}">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'),
+}
+
+
+def _styles_xml(font: str, font_size: int, lang: str) -> str:
+    """
+    Returns: word/styles.xml with the default font and language of the document, as set_document_language sets it.
+    """
+    font, size, lang = escape(font, {'"': "&quot;"}), font_size * 2, escape(lang, {'"': "&quot;"})
+    fonts = f'<w:rFonts w:ascii="{font}" w:hAnsi="{font}" w:eastAsia="{font}" w:cs="{font}"/>'
+    properties = f'<w:rPr>{fonts}<w:sz w:val="{size}"/><w:szCs w:val="{size}"/><w:lang w:val="{lang}"/></w:rPr>'
+    return (f'<w:styles xmlns:w="{_W}"><w:docDefaults><w:rPrDefault>{properties}</w:rPrDefault></w:docDefaults>'
+            f'<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/>'
+            f'{properties}</w:style></w:styles>')
+
+
+class DocxWriter(ConcordanceWriter):
+    """
+    One concordance per paragraph of a Word document in the Normal style (Aptos 11 pt, cs-CZ).
+    """
+    suffix = ".docx"
+
+    def __init__(self, path: Path, max_lines: int = None, max_bytes: int = None,
+                 font: str = "Aptos", font_size: int = 11, lang: str = "cs-CZ"):
+        super().__init__(path, max_lines, max_bytes)
+        self.font, self.font_size, self.lang = font, font_size, lang
+
+    def _encode(self, line: str) -> bytes:
+        text = escape(_invalid_xml_pattern.sub("", line))
+        return f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'.encode("utf-8")
+
+    def _open(self, path: Path) -> None:
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        for name, part in _DOCX_PARTS.items():
+            self._zip.writestr(name, _XML_DECLARATION + part)
+        self._zip.writestr("word/styles.xml", _XML_DECLARATION + _styles_xml(self.font, self.font_size, self.lang))
+        # the paragraphs are compressed as they come, only the current block is kept in memory
+        self._document = self._zip.open("word/document.xml", "w", force_zip64=True)
+        self._document.write(f'{_XML_DECLARATION}<w:document xmlns:w="{_W}"><w:body>'.encode("utf-8"))
+
+    def _write_line(self, data: bytes) -> None:
+        self._document.write(data)
+
+    def _close(self) -> None:
+        self._document.write(b"<w:sectPr/></w:body></w:document>")
+        self._document.close()
+        self._zip.close()
+
+
+WRITERS = {writer.suffix: writer for writer in (TxtWriter, JsonlWriter, DocxWriter)}
+
+
+def get_writer(path: Path, format: str = None, max_lines: int = None, max_bytes: int = None) -> ConcordanceWriter:
+    """
+    Returns: A writer of the format ("txt", "jsonl" or "docx"; defaults to the suffix of the path).
+
+    Raises:
+        ValueError: if there is no writer for the format
+    """
+    path = Path(path)
+    suffix = f".{format.lstrip('.')}" if format else path.suffix
+    if suffix not in WRITERS:
+        raise ValueError(f"Unknown output format '{suffix}', use one of {', '.join(WRITERS)}.")
+    return WRITERS[suffix](path, max_lines=max_lines, max_bytes=max_bytes)
+
+
+def write_concordances(concordances: Iterable[str], path: Path, format: str = None, max_lines: int = None,
+                       max_bytes: int = None, open_viewer: bool = None) -> list[Path]:
+    """
+    Write the concordances into the file, or into numbered chunks of it (see the module docstring).
+
+    Args:
+        concordances: lines to be written, e.g. a generator; they are consumed one by one
+        path: the output file
+        format: "txt", "jsonl" or "docx"; defaults to the suffix of the path
+        max_lines: the maximum number of lines in a chunk; defaults to settings.OUTPUT_CHUNK_MAX_LINES
+        max_bytes: the maximum size of a chunk; defaults to settings.OUTPUT_CHUNK_MAX_BYTES
+        open_viewer: open the first written file in the default application; defaults to
+            settings.OPEN_OUTPUT_IN_VIEWER
+
+    Returns:
+        The paths of the written files.
+    """
+    with get_writer(path, format, max_lines, max_bytes) as writer:
+        number_of_lines = writer.write_all(concordances)
+    print(f"Successfully wrote {number_of_lines} concordances to {', '.join(chunk.name for chunk in writer.paths)}.")
+
+    open_viewer = settings.OPEN_OUTPUT_IN_VIEWER if open_viewer is None else open_viewer
+    if open_viewer:
+        open_in_viewer(writer.paths[0])
+    return writer.paths
+
+
+def open_in_viewer(path: Path) -> bool:
+    """
+    Open the file in the default application of the system (Windows, macOS, or Linux with xdg-open),
+    without waiting for it to close.
+
+    Returns: False if there is no way to open it here (then only a message is printed).
+    """
+    path = Path(path)
+    try:
+        if sys.platform == "win32":
+            os.startfile(path)
+            return True
+        opener = "open" if sys.platform == "darwin" else shutil.which("xdg-open")
+        if opener is not None:
+            subprocess.Popen([opener, str(path)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return True
+    except OSError as e:
+        print(f"Could not open {path}: {e}")
+        return False
+    print(f"No viewer available, open {path} manually.")
+    return False
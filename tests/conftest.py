@@ -0,0 +1,18 @@
+import pytest
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.utils import query_logs, utils
+
+
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    """
+    A temporary FILES_DIR with its own dedup index and stats manifest.
+    """
+    monkeypatch.setattr(settings, "FILES_DIR", tmp_path)
+    monkeypatch.setattr(settings, "DEDUP_INDEX_PATH", tmp_path / "dedup_index.sqlite")
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_INDEX_PATH", tmp_path / "near_duplicate_index.sqlite")
+    monkeypatch.setattr(settings, "STATS_MANIFEST_PATH", tmp_path / "stats_manifest.json")
+    monkeypatch.setattr(utils, "FILES_DIR", tmp_path)
+    monkeypatch.setattr(query_logs, "FILES_DIR", tmp_path)
+    return tmp_path
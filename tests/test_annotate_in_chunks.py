@@ -0,0 +1,29 @@
+import random as rd
+
+import pytest
+
+from opravidlo_annotations.core.concordance2annotation import create_annotation_plan
+from opravidlo_annotations.core.generate_concordances import _annotate_in_chunks
+from opravidlo_annotations.setup_nltk import is_nltk_data_installed
+from opravidlo_annotations.utils.dedup_index import DedupIndex
+
+CONCORDANCES = [f"Věta číslo {i}. Baterku {'nevybil' if i % 3 else 'nic'} až do konce. Další věta." for i in range(50)]
+
+
+def _annotate(workers: int, index: DedupIndex = None) -> list[str]:
+    plan = create_annotation_plan("nevybil", ["nevybyl"], True, False)
+    rd.seed(1)
+    return list(_annotate_in_chunks(plan, CONCORDANCES, workers, chunk_size=7, index=index))
+
+
+def test_spawned_workers_get_the_plan_and_the_index(files_dir):
+    plan = create_annotation_plan("vybýt", ["vybít"], True, True)  # a code in no concordance, nothing is tokenized
+    with DedupIndex() as index:
+        assert list(_annotate_in_chunks(plan, CONCORDANCES, workers=2, chunk_size=7, index=index)) == []
+
+
+@pytest.mark.skipif(not is_nltk_data_installed(), reason="the Czech Punkt model is not installed, see setup_nltk.py")
+def test_the_workers_annotate_as_this_process():
+    annotated = _annotate(1)
+    assert len(annotated) == 33
+    assert _annotate(2) == annotated
@@ -0,0 +1,69 @@
+import pytest
+
+from opravidlo_annotations import settings
+from opravidlo_annotations.api import cache
+from opravidlo_annotations.api.polling import poll_until_ready
+
+LINES = [{"toknum": 1, "Kwic": [{"str": "vybil"}]}, {"toknum": 2, "Kwic": [{"str": "vybyl"}]}]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def _fetcher(lines: list[dict], **fields):
+    calls = []
+
+    def fetch_lines(meta: dict):
+        calls.append(meta)
+        meta.update(fields)
+        yield from lines
+
+    return fetch_lines, calls
+
+
+def _cached(fetch_lines, **kwargs) -> list[dict]:
+    return list(cache.cached_lines("kontext", "syn2015", '[lc="vybil"]', 2, fetch_lines, **kwargs))
+
+
+def test_complete_response_is_cached(cache_dir):
+    fetch_lines, calls = _fetcher(LINES, concsize=2, finished=True)
+    assert _cached(fetch_lines) == LINES
+    assert _cached(fetch_lines) == LINES
+    assert len(calls) == 1
+    assert _cached(fetch_lines, use_cache=False) == LINES
+    assert len(calls) == 2
+    assert len(list(cache_dir.glob("*.jsonl"))) == 1 and not list(cache_dir.glob("*.tmp"))
+
+
+@pytest.mark.parametrize("lines, fields", [([], {"concsize": 0}), (LINES[:1], {"finished": False, "timed_out": True})])
+def test_empty_or_timed_out_response_is_not_cached(cache_dir, lines, fields):
+    fetch_lines, calls = _fetcher(lines, **fields)
+    assert _cached(fetch_lines) == lines
+    assert _cached(fetch_lines) == lines
+    assert len(calls) == 2
+    assert not list(cache_dir.iterdir())
+
+
+def test_partly_consumed_response_is_not_cached(cache_dir):
+    fetch_lines, _ = _fetcher(LINES)
+    lines = cache.cached_lines("kontext", "syn2015", '[lc="vybil"]', 2, fetch_lines)
+    assert next(lines) == LINES[0]
+    lines.close()
+    assert not list(cache_dir.iterdir())
+
+
+def test_expired_entry_is_fetched_again(monkeypatch):
+    fetch_lines, calls = _fetcher(LINES)
+    _cached(fetch_lines)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_TTL", -1)
+    _cached(fetch_lines)
+    assert len(calls) == 2
+
+
+def test_poll_timeout_is_marked():
+    unfinished = {"finished": False, "concsize": 1, "Lines": LINES[:1]}
+    assert poll_until_ready(lambda: unfinished, min_lines=2, timeout=0)["timed_out"] is True
+    assert "timed_out" not in poll_until_ready(lambda: unfinished, min_lines=1, timeout=0)
@@ -0,0 +1,56 @@
+from opravidlo_annotations.utils import utils
+from opravidlo_annotations.utils.stats_manifest import txt_stats
+
+LINES = [
+    "Stál před [*jejích|jejich|corpus*] chalupou.\n",
+    "Baterku [*nevybil|nevybyl|corpus*] až do konce.\n",
+    "Stál před [*jejich|jejích|corpus*] chalupou.\n",   # the first sentence with the other variant chosen
+    "\n",
+    "\n",
+    "Baterku [*nevybil|nevybyl|corpus*] až do konce.\n",
+]
+
+
+def _data_path(files_dir, filename):
+    return files_dir / f"{utils.DATA_CATEGORY}_{filename}.txt"
+
+
+def test_find_duplicates_ignores_the_annotation_and_keeps_blank_lines():
+    without_duplicates, duplicates = utils.find_duplicates(LINES)
+    assert without_duplicates == LINES[:2] + ["\n", "\n"]
+    assert duplicates == [LINES[2], LINES[5]]
+
+
+def test_check_removes_the_duplicates_inside_the_file_once(files_dir, capsys):
+    path = _data_path(files_dir, "x")
+    path.write_text("".join(LINES), encoding="utf-8")
+
+    utils.check("x")
+    assert path.read_text(encoding="utf-8") == "".join(LINES[:2] + ["\n", "\n"])
+    output = capsys.readouterr().out
+    assert "Removed 2 duplicates inside 'x' file." in output
+    assert "No duplicates found." in output and "Found" not in output
+    assert txt_stats(path)["duplicates"] == []
+
+    mtime = path.stat().st_mtime_ns
+    utils.check("x")
+    assert path.stat().st_mtime_ns == mtime     # nothing left to remove, the file is not rewritten
+    assert "Removed" not in capsys.readouterr().out
+
+
+def test_check_reports_duplicates_in_other_files_without_rewriting(files_dir, capsys):
+    other_path = _data_path(files_dir, "a")
+    other_path.write_text(LINES[0], encoding="utf-8")
+    path = _data_path(files_dir, "x")
+    path.write_text(LINES[1] + LINES[2], encoding="utf-8")
+    mtime = path.stat().st_mtime_ns
+
+    utils.check("x")
+    assert path.stat().st_mtime_ns == mtime
+    assert f"line 2: first in '{other_path.name}' on line 1" in capsys.readouterr().out
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(LINES[5])
+    assert txt_stats(path)["duplicates"] == [[2, other_path.name, 1], [3, path.name, 1]]
+    utils.check("x")
+    assert path.read_text(encoding="utf-8") == LINES[1] + LINES[2]
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from opravidlo_annotations.benchmark_punctuation import correct_punctuation_chain, generate_sentences
+from opravidlo_annotations.core.concordance2annotation import correct_punctuation
+
+# inputs from generate_sentences(2000, seed=2024) and the outputs of the original chain of re.sub
+GOLDEN_CORPUS = Path(__file__).parent / "data" / "correct_punctuation_golden.jsonl"
+
+
+def test_golden_corpus():
+    with open(GOLDEN_CORPUS, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f]
+    assert len(cases) == 2000
+    for case in cases:
+        assert correct_punctuation(case["input"]) == case["expected"], repr(case["input"])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_as_chain(seed):
+    for sentence in generate_sentences(5000, seed):
+        assert correct_punctuation(sentence) == correct_punctuation_chain(sentence), repr(sentence)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Řekl , že ... prý přijde .", "Řekl, že… prý přijde."),
+    ('Nazval to "dobrou zprávou" .', "Nazval to „dobrou zprávou“."),
+    ("Přijde - li , tak - to  bude ( asi ) dobré", "Přijde -li, tak – to bude (asi) dobré"),
+])
+def test_examples(text, expected):
+    assert correct_punctuation(text) == expected
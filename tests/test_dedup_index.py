@@ -0,0 +1,82 @@
+import pickle
+
+from opravidlo_annotations.utils.dedup_index import DedupIndex
+
+FIRST = "Stál před [*jejích|jejich|corpus*] chalupou.\n"
+SECOND = "Baterku [*nevybil|nevybyl|corpus*] až do konce.\n"
+THIRD = "Auto nikdo [*nevybil|nevybyl|corpus*].\n"
+
+
+def _write(path, text: str, mode: str = "w") -> None:
+    with open(path, mode, encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_sentences_are_found_without_the_annotation(files_dir):
+    _write(files_dir / "data_a.txt", FIRST + "\n" + SECOND)
+    _write(files_dir / "README_a.txt", THIRD)     # not a data file
+    with DedupIndex() as index:
+        assert index.find("Stál před jejich  chalupou. ") == ("data_a.txt", 1)
+        assert index.find("Stál před [*jejich|jejích|corpus*] chalupou.") == ("data_a.txt", 1)
+        assert index.find(SECOND) == ("data_a.txt", 3)
+        assert not index.contains(THIRD)
+
+
+def test_only_the_appended_lines_are_read(files_dir, monkeypatch):
+    path = files_dir / "data_a.txt"
+    _write(path, FIRST)
+    with DedupIndex() as index:
+        index.sync()
+        _write(path, SECOND, "a")
+        inserted = []
+        insert = index._insert
+        monkeypatch.setattr(index, "_insert", lambda line, *args: inserted.append(line) or insert(line, *args))
+        index.sync()
+        assert inserted == [SECOND.rstrip("\n")]
+        assert index.find(SECOND) == ("data_a.txt", 2)
+
+
+def test_an_edited_or_removed_file_rebuilds_the_index(files_dir):
+    a, b = files_dir / "data_a.txt", files_dir / "data_b.txt"
+    _write(a, FIRST + SECOND)
+    _write(b, SECOND + THIRD)
+    with DedupIndex() as index:
+        index.sync()
+        assert index.find(SECOND) == ("data_a.txt", 2)
+
+        _write(a, FIRST)    # e.g. by remove_duplicates
+        index.sync()
+        assert index.find(SECOND) == ("data_b.txt", 1)
+
+        _write(a, THIRD)    # another sentence instead
+        index.sync()
+        assert not index.contains(FIRST) and index.find(THIRD) == ("data_a.txt", 1)
+
+        b.unlink()
+        index.sync()
+        assert not index.contains(SECOND)
+
+
+def test_filter_new_registers_the_written_lines(files_dir):
+    path = files_dir / "data_a.txt"
+    _write(path, FIRST)
+    with DedupIndex() as index:
+        new_lines = list(index.filter_new([SECOND.rstrip("\n"), "Stál před jejich chalupou.", THIRD.rstrip("\n"),
+                                           SECOND.rstrip("\n")], path))
+        assert new_lines == [SECOND.rstrip("\n"), THIRD.rstrip("\n")]
+        _write(path, "".join(line + "\n" for line in new_lines), "a")
+        index.refresh_file(path)
+        assert index.find(THIRD) == ("data_a.txt", 3)
+
+    with DedupIndex() as index:     # a new handle reads the persisted index
+        index.sync()
+        assert index.find(THIRD) == ("data_a.txt", 3)
+
+
+def test_the_index_can_be_passed_to_another_process(files_dir):
+    _write(files_dir / "data_a.txt", FIRST)
+    with DedupIndex() as index:
+        index.sync()
+        copy = pickle.loads(pickle.dumps(index))
+    with copy:
+        assert copy.find(FIRST) == ("data_a.txt", 1)
@@ -0,0 +1,22 @@
+import json
+
+from opravidlo_annotations import jobs
+from opravidlo_annotations.utils import utils
+
+JOB = {"name": "nevybi", "corpus_manager": "kontext", "corpus_name": "syn2015", "query": "[lc=\"nevybil\"]",
+       "target": "nevybi", "variants": ["nevyby"], "variants_weights": None, "is_target_valid": True,
+       "is_target_code": False, "number_of_concordances_to_fetch": 3, "number_of_concordances_to_log": None,
+       "filename": "x"}
+
+
+def test_run_job_logs_only_the_saved_concordances(files_dir, monkeypatch):
+    concordances = ["Baterku [*nevybil|nevybyl|corpus*] až do konce.", "Auto [*nevybil|nevybyl|corpus*] nikdo.",
+                    "Baterku [*nevybyl|nevybil|corpus*] až do konce."]   # the first sentence again
+    (files_dir / f"{utils.DATA_CATEGORY}_a.txt").write_text("Auto [*nevybil|nevybyl|corpus*] nikdo.\n",
+                                                             encoding="utf-8")
+    monkeypatch.setattr(jobs, "generate_concordances", lambda *args, **kwargs: list(concordances))
+
+    assert jobs.run_job(JOB) == 1
+    assert (files_dir / f"{utils.DATA_CATEGORY}_x.txt").read_text(encoding="utf-8") == concordances[0] + "\n"
+    with open(files_dir / "README_x.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["number_of_concordances"] for line in f] == [1]
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from opravidlo_annotations.api.json_stream import iter_json_array
+
+RESPONSE = {
+    "concsize": 125, "relsize": 12.5, "fullsize": 1.25e3, "arf": -0.75E-2, "finished": True, "error": None,
+    "Lines": [
+        {"toknum": 1052, "Left": [{"str": "Stál před"}], "Kwic": [{"str": "jejích"}],
+         "Right": [{"str": "chalupou \"u lesa\" – 2,5 km\\n"}], "score": 0.125, "ratio": 3e-5},
+        {"toknum": -7, "Left": [], "Kwic": [{"str": "čeština ☺"}], "Right": [], "score": 10, "flags": [False, None]},
+        [], 0, -0.0, 1E+10, "ř",
+    ],
+    "questionable": False, "pagesize": 50,
+}
+TEXT = json.dumps(RESPONSE, ensure_ascii=False)
+
+
+def _parse(chunks: list) -> tuple[list, dict]:
+    meta = {}
+    return list(iter_json_array(chunks, "Lines", meta)), meta
+
+
+def _expected_meta() -> dict:
+    return {key: value for key, value in RESPONSE.items() if key != "Lines"}
+
+
+@pytest.mark.parametrize("encode", [False, True])
+def test_every_split_point(encode):
+    data = TEXT.encode("utf-8") if encode else TEXT
+    for i in range(len(data) + 1):
+        lines, meta = _parse([data[:i], data[i:]])
+        assert lines == RESPONSE["Lines"], f"split at {i}: {data[max(0, i - 10):i]!r} | {data[i:i + 10]!r}"
+        assert meta == _expected_meta()
+
+
+def test_every_chunk_size():
+    data = TEXT.encode("utf-8")
+    for size in range(1, 40):
+        lines, meta = _parse([data[i:i + size] for i in range(0, len(data), size)])
+        assert lines == RESPONSE["Lines"]
+        assert meta == _expected_meta()
+
+
+def test_missing_key_and_empty_array():
+    assert _parse(['{"a": 1.', '5}']) == ([], {"a": 1.5})
+    assert _parse(['{"Lines": [', ']}']) == ([], {})
+
+
+def test_invalid_json():
+    with pytest.raises(ValueError):
+        _parse(['{"Lines": [1 2]}'])
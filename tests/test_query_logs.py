@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from opravidlo_annotations.utils import query_logs
+
+
+class Crash(Exception):
+    pass
+
+
+def _log(number_of_queries: int, start: int = 0) -> None:
+    for i in range(start, start + number_of_queries):
+        query_logs.log_the_query("x", "syn2015", f'[lc="vybil{i}"]', i, "vybil", ["vybyl"], True)
+
+
+def _logged_queries(files_dir) -> list[str]:
+    with open(files_dir / "README_x.json", encoding="utf-8") as f:
+        return [query["query"] for query in json.load(f)["queries"]]
+
+
+def _expected(number_of_queries: int) -> list[str]:
+    return [f'[lc="vybil{i}"]' for i in range(number_of_queries)]
+
+
+def test_compaction_moves_the_log_into_the_readme(files_dir):
+    _log(3)
+    data = query_logs.compact_query_log(Path("README_x.json"))
+    assert [query["query"] for query in data["queries"]] == _expected(3)
+    assert _logged_queries(files_dir) == _expected(3)
+    assert not (files_dir / "README_x.jsonl").exists()
+    assert not query_logs.pending_query_logs(files_dir / "README_x.json")
+
+    _log(2, start=3)
+    query_logs.compact_query_log(Path("README_x.json"))
+    query_logs.compact_query_log(Path("README_x.json"))     # nothing new
+    assert _logged_queries(files_dir) == _expected(5)
+
+
+def test_crash_after_the_rename(files_dir, monkeypatch):
+    _log(2)
+    query_logs.compact_query_log(Path("README_x.json"))
+    _log(3, start=2)
+
+    def crash(*args):
+        raise Crash()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(query_logs, "_write_json_atomically", crash)
+        with pytest.raises(Crash):
+            query_logs.compact_query_log(Path("README_x.json"))
+    assert _logged_queries(files_dir) == _expected(2)
+    assert len(query_logs.pending_query_logs(files_dir / "README_x.json")) == 1
+    assert len(query_logs.read_logged_queries(files_dir / "README_x.json")) == 5
+
+    _log(1, start=5)    # logged before the next compaction
+    query_logs.compact_query_log(Path("README_x.json"))
+    assert _logged_queries(files_dir) == _expected(6)
+    assert not query_logs.pending_query_logs(files_dir / "README_x.json")
+
+
+def test_crash_after_the_write(files_dir, monkeypatch):
+    _log(3)
+    unlink = Path.unlink
+
+    def crash(path, *args, **kwargs):
+        if path.suffix == ".compacting":
+            raise Crash()
+        unlink(path, *args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Path, "unlink", crash)
+        with pytest.raises(Crash):
+            query_logs.compact_query_log(Path("README_x.json"))
+    assert _logged_queries(files_dir) == _expected(3)
+    assert len(query_logs.pending_query_logs(files_dir / "README_x.json")) == 1
+    assert len(query_logs.read_logged_queries(files_dir / "README_x.json")) == 3     # the merged log is not counted
+
+    query_logs.compact_query_log(Path("README_x.json"))     # the merged log is only deleted
+    assert _logged_queries(files_dir) == _expected(3)
+    assert not query_logs.pending_query_logs(files_dir / "README_x.json")
@@ -0,0 +1,34 @@
+import json
+
+from opravidlo_annotations import report
+
+
+def _query(corpus: str, number_of_concordances: int) -> dict:
+    return {"query": "[word=\"vybil\"]", "corpus_name": corpus, "number_of_concordances": number_of_concordances,
+            "is_looking_for": "correct", "correct": ["vybil"], "error": ["vybyl"]}
+
+
+def _write_log(path, queries: list[dict]) -> None:
+    path.write_text("".join(json.dumps(query) + "\n" for query in queries), encoding="utf-8")
+
+
+def test_query_logs_without_a_json_readme_are_reported(tmp_path):
+    category = tmp_path / "vyjm_slova" / "vybít_vybýt"
+    category.mkdir(parents=True)
+    (category / "data_x.txt").write_text("Baterku [*vybyl|vybil|corpus*] úplně.\n", encoding="utf-8")
+    _write_log(category / "README_w.jsonl", [_query("syn2015", 3), _query("net", 2)])
+    _write_log(category / "README_v.0123abcd.compacting", [_query("syn2015", 5)])   # an interrupted compaction
+    (category / "README_u.json").write_text(json.dumps(
+        {"queries": [_query("net", 7)], "comments": [], "last_compaction": "merged"}), encoding="utf-8")
+    _write_log(category / "README_u.merged.compacting", [_query("net", 7)])     # merged, but not deleted yet
+    _write_log(category / "README_u.jsonl", [_query("net", 1)])
+
+    data_files, readmes = report.find_files(tmp_path)
+    assert readmes == [category / "README_u.json", category / "README_v.json", category / "README_w.json"]
+
+    result = report.build_report(tmp_path, workers=1)
+    entry = result["categories"]["vyjm_slova/vybít_vybýt"]
+    assert (entry["data_files"], entry["annotated"]) == (1, 1)
+    assert (entry["query_logs"], entry["queries"], entry["logged_concordances"]) == (3, 5, 18)
+    assert entry["files"]["README_w.json"]["corpora"] == {"syn2015": 3, "net": 2}
+    assert entry["files"]["README_u.json"]["queries"] == 2
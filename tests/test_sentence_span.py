@@ -0,0 +1,47 @@
+import pytest
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+from opravidlo_annotations.core import concordance2annotation as c2a
+
+TEXTS = [
+    "Stál před chalupou. Baterku nevybil např. až do konce. „Řekl to.“ "
+    "A pak (tzv. konec.) odešel! Co?  Ano…",
+    "bez tečky na konci a tak dál",
+    "Věta jedna.Věta dvě. \"Citát.\" Konec",
+]
+
+
+class _PublicTokenizer:
+    """
+    The tokenizer with only its public methods, like in a version of nltk without the internals.
+    """
+    def __init__(self, tokenizer: PunktSentenceTokenizer):
+        self.span_tokenize = tokenizer.span_tokenize
+        self.text_contains_sentbreak = tokenizer.text_contains_sentbreak
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    """
+    The default English Punkt parameters with the Czech abbreviations; the Czech model may not be installed.
+    """
+    tokenizer = PunktSentenceTokenizer()
+    tokenizer._params.abbrev_types.update(c2a.CZECH_ABBREVIATIONS)
+    monkeypatch.setattr(c2a, "_sentence_tokenizer", lambda: tokenizer)
+    return tokenizer
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_sentence_span_is_the_span_of_span_tokenize(tokenizer, text):
+    for i, char in enumerate(text):
+        if char.isalnum():
+            expected = c2a._sentence_span_by_tokenizing(tokenizer, text, i, i + 1)
+            assert c2a._sentence_span(tokenizer, text, i, i + 1) == expected
+            assert c2a._sentence_span(_PublicTokenizer(tokenizer), text, i, i + 1) == expected
+
+
+def test_extract_sentences_with_targets(tokenizer):
+    assert c2a.extract_sentences_with_targets([TEXTS[0], TEXTS[0], TEXTS[1]], ["nevybil", "vybyl", "konci"]) == \
+        ["Baterku nevybil např. až do konce.", None, "bez tečky na konci a tak dál"]
+    with pytest.raises(ValueError):
+        c2a.extract_sentences_with_targets(TEXTS, ["konce"])
@@ -0,0 +1,44 @@
+from opravidlo_annotations import settings
+from opravidlo_annotations.api import sketch_engine
+
+
+def _fake_server(monkeypatch, responses: list[dict]) -> list[tuple]:
+    """
+    Replace the requests by the responses (the last one is repeated); returns the list of the requests.
+    """
+    requests = []
+
+    def iter_concordances(corpus_name, query, number_of_concordances, page_number=1, sample_size=None, meta=None):
+        requests.append((number_of_concordances, page_number, sample_size))
+        response = responses[min(len(requests), len(responses)) - 1]
+        if meta is not None:
+            meta.update({key: value for key, value in response.items() if key != "Lines"})
+        yield from response["Lines"][:number_of_concordances]
+
+    monkeypatch.setattr(sketch_engine, "iter_concordances_from_sketch", iter_concordances)
+    monkeypatch.setattr(settings, "POLL_INITIAL_DELAY", 0)
+    return requests
+
+
+def test_finished_sample_costs_one_request(monkeypatch):
+    lines = [{"toknum": i} for i in range(5)]
+    requests = _fake_server(monkeypatch, [{"concsize": 5, "finished": True, "Lines": lines}])
+    assert list(sketch_engine.iter_random_sample_from_sketch("syn", "[]", 5)) == lines
+    assert requests == [(5, 1, 5)]
+
+
+def test_unfinished_sample_is_polled(monkeypatch):
+    lines = [{"toknum": i} for i in range(5)]
+    requests = _fake_server(monkeypatch, [{"concsize": 2, "finished": False, "Lines": lines[:2]},
+                                          {"concsize": 5, "finished": True, "Lines": lines}])
+    assert list(sketch_engine.iter_random_sample_from_sketch("syn", "[]", 5)) == lines
+    assert requests == [(5, 1, 5), (5, 1, 5)]
+
+
+def test_scattered_pages_reuse_the_first_page(monkeypatch):
+    monkeypatch.setattr(sketch_engine.rd, "sample", lambda population, k: list(population)[:k])
+    lines = [{"toknum": i} for i in range(2)]
+    requests = _fake_server(monkeypatch, [{"error": "sampling is not supported", "Lines": []},
+                                          {"concsize": 100, "finished": True, "Lines": lines}])
+    assert len(list(sketch_engine.iter_random_sample_from_sketch("syn", "[]", 8))) == 8
+    assert requests == [(8, 1, 8), (2, 1, None), (2, 2, None), (2, 3, None), (2, 4, None)]
@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+from opravidlo_annotations.utils import query_logs, stats_manifest
+from opravidlo_annotations.utils.stats_manifest import json_stats, txt_stats
+
+VYBIL = "Baterku [*nevybyl|nevybil|corpus*] až do konce.\n"
+VYBYL = "Pes se [*vybil|vybyl|corpus*] z boudy.\n"
+
+
+def _append(path, text: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _read_lines(monkeypatch) -> list:
+    """
+    Returns: The list into which the number of lines read by every call of _read_tail is appended.
+    """
+    numbers_of_read_lines = []
+    read_tail = stats_manifest._read_tail
+
+    def counting_read_tail(entry, *args):
+        number_of_lines = entry["number_of_lines"]
+        read_tail(entry, *args)
+        numbers_of_read_lines.append(entry["number_of_lines"] - number_of_lines)
+
+    monkeypatch.setattr(stats_manifest, "_read_tail", counting_read_tail)
+    return numbers_of_read_lines
+
+
+def test_only_the_appended_lines_are_read(files_dir, monkeypatch):
+    path = files_dir / "data_x.txt"
+    _append(path, VYBIL + "\n" + VYBYL)
+    numbers_of_read_lines = _read_lines(monkeypatch)
+
+    stats = txt_stats(path)
+    assert (stats["counts"], stats["total"], stats["number_of_lines"]) == \
+        ({"[*nevybyl|nevybil|corpus*]": 1, "[*vybil|vybyl|corpus*]": 1}, 2, 3)
+    assert txt_stats(path) == stats     # unchanged, nothing is read
+
+    _append(path, VYBYL + "Bez anotace")     # the unfinished last line is read next time
+    stats = txt_stats(path)
+    assert (stats["total"], stats["number_of_lines"], stats["duplicates"]) == (3, 4, [[4, "data_x.txt", 3]])
+    _append(path, ".\n")
+    assert txt_stats(path)["number_of_lines"] == 5
+    assert numbers_of_read_lines == [3, 1, 1]
+
+
+def test_an_edited_file_is_read_again(files_dir, monkeypatch):
+    path = files_dir / "data_x.txt"
+    _append(path, VYBIL + VYBYL)
+    txt_stats(path)
+    numbers_of_read_lines = _read_lines(monkeypatch)
+
+    path.write_text(VYBYL + VYBIL + VYBIL, encoding="utf-8")    # longer, but not only appended
+    stats = txt_stats(path)
+    assert (stats["total"], stats["number_of_lines"], stats["duplicates"]) == (3, 3, [[3, "data_x.txt", 2]])
+    assert numbers_of_read_lines == [3]
+
+
+def test_json_stats_count_the_readme_and_the_query_log(files_dir):
+    def log(target: str, number_of_concordances: int) -> None:
+        query_logs.log_the_query("x", "syn2015", f'[lc="{target}"]', number_of_concordances, target, [], True)
+
+    readme_path = files_dir / "README_x.json"
+    log("vybil", 3)
+    log("vybyl", 2)
+    assert json_stats(readme_path) == {"counts": {"vybil": 3, "vybyl": 2}, "total": 5}
+    log("vybil", 1)
+    assert json_stats(readme_path) == {"counts": {"vybil": 4, "vybyl": 2}, "total": 6}
+
+    query_logs.compact_query_log(Path(readme_path.name))
+    assert json_stats(readme_path) == {"counts": {"vybil": 4, "vybyl": 2}, "total": 6}
+    log("vybyl", 5)
+    assert json_stats(readme_path)["counts"] == {"vybil": 4, "vybyl": 7}
+    assert json.loads(readme_path.read_text(encoding="utf-8"))["queries"][0]["correct"] == ["vybil"]